@@ -0,0 +1,206 @@
+"""Benchmark riproducibili (offline) della pipeline commissioni.
+
+Copre caricamento del listino (sorgente e snapshot), lookup CVF per gruppi variabili,
+a scaglioni e veicoli, `calculate_fees` (Decimal, centesimi, con QuoteCache) e i percorsi
+batch NumPy, su ordini sintetici con seed fisso, dimensione e mix configurabili.
+
+Uso:
+    python benchmarks.py --orders 20000 --mix variable=0.5,tiered=0.3,vehicle=0.1,unknown=0.1
+    python benchmarks.py --json risultati.json                 # report leggibile da macchina
+    python benchmarks.py --compare risultati.json --tolerance 0.25  # esce con 1 se qualcosa rallenta
+    python benchmarks.py --profile profilo.json                # tempi per fase di calculate_fees
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import fee_engine
+from fee_engine import (COUNTRY_MAP, DEFAULT_FEE_FILE, calculate_fees, get_final_value_fee_rate_and_group,
+                        load_fee_data)
+
+DEFAULT_ORDERS = 20_000
+DEFAULT_MIX = {"variable": 0.5, "tiered": 0.3, "vehicle": 0.1, "unknown": 0.1}
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25
+UNKNOWN_CATEGORY = 999_999_999
+
+
+# --- Workload ---
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in DEFAULT_MIX or not weight:
+            raise SystemExit(f"--mix {part!r}: atteso <tipo>=<peso>, tipi: {', '.join(DEFAULT_MIX)}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def category_pools(fee_data):
+    pools = {"variable": [], "tiered": [], "vehicle": list(fee_data['_vehicle_category_map']),
+             "unknown": [UNKNOWN_CATEGORY]}
+    for cat_id, group in fee_data['_category_map'].items():
+        if cat_id not in fee_data['_vehicle_category_map']:
+            pools["tiered" if 'tiers' in group else "variable"].append(cat_id)
+    return pools
+
+
+def synthetic_orders(fee_data, n=DEFAULT_ORDERS, mix=None, seed=0):
+    """Argomenti posizionali di calculate_fees, riproducibili a parita' di seed."""
+    rnd = random.Random(seed)
+    pools = category_pools(fee_data)
+    kinds = [kind for kind in (mix or DEFAULT_MIX) if pools[kind]]
+    weights = [(mix or DEFAULT_MIX)[kind] for kind in kinds]
+    countries = list(COUNTRY_MAP)
+    stores = ["Nessuno"] + list(fee_data['insertion_fees']['store_subscriptions'])
+    orders = []
+    for kind in rnd.choices(kinds, weights, k=n):
+        listing_type = rnd.choice(["Asta", "Compralo Subito"])
+        orders.append([round(rnd.uniform(1, 3000), 2), rnd.choice([0.0, 4.99, 9.9]), round(rnd.uniform(0, 1500), 2),
+                       rnd.choice([0.0, 4.5, 8.0]), rnd.choice(pools[kind]), rnd.choice(countries),
+                       rnd.choice(["Standard", "Venditore Affidabilità Top", "Sotto lo standard"]), rnd.random() < 0.1,
+                       rnd.choice(stores), rnd.randint(1, 12_000), listing_type, rnd.random() < 0.2,
+                       round(rnd.uniform(0, 5000), 2), listing_type == "Asta" and rnd.random() < 0.3,
+                       rnd.random() < 0.9, 22.0])
+    return orders
+
+
+def batch_columns(orders):
+    import numpy as np
+
+    names = ("item_price", "shipping_charged_to_customer", "item_cost", "your_actual_shipping_cost", "category_id",
+             "buyer_country", "seller_status", "high_inad_surcharge", "store_subscription", "num_listings_this_month",
+             "listing_type", "add_subtitle", "reserve_price_value", "use_reserve_price", "apply_vat", "vat_rate_input")
+    columns = {name: np.array(values) for name, values in zip(names, zip(*orders))}
+    columns['vat_rate_input'] = 22.0
+    return columns
+
+
+# --- Timing ---
+def measure(fn, ops, repeat=DEFAULT_REPEAT):
+    """Esegue fn() `repeat` volte; tempi per operazione in microsecondi (fn esegue `ops` operazioni)."""
+    fn()  # riscaldamento (cache, import pigri)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) / ops * 1e6)
+    return {'ops': ops, 'best_us': min(samples), 'median_us': statistics.median(samples)}
+
+
+def run_benchmarks(n=DEFAULT_ORDERS, mix=None, seed=0, repeat=DEFAULT_REPEAT, fee_file=DEFAULT_FEE_FILE):
+    results = {}
+    fee_data = load_fee_data(fee_file, use_snapshot=False)
+    orders = synthetic_orders(fee_data, n, mix, seed)
+
+    results['load_fee_data'] = measure(lambda: load_fee_data(fee_file, use_snapshot=False), 1, repeat)
+    from fee_schedule import snapshot_path, write_snapshot
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = shutil.copy(fee_file, os.path.join(tmp, os.path.basename(fee_file)))
+        write_snapshot(snapshot_path(copy), load_fee_data(copy, use_snapshot=False))
+        results['load_fee_data (snapshot)'] = measure(lambda: load_fee_data(copy), 1, repeat)
+
+    pools = category_pools(fee_data)
+    prices = [order[0] for order in orders]
+    for kind in ("variable", "tiered", "vehicle"):
+        if pools[kind]:
+            cats = [pools[kind][i % len(pools[kind])] for i in range(len(prices))]
+            results[f'get_final_value_fee_rate_and_group ({kind})'] = measure(
+                lambda: [get_final_value_fee_rate_and_group(c, p, fee_data) for c, p in zip(cats, prices)],
+                len(prices), repeat)
+
+    previous = fee_engine.get_arithmetic()
+    try:
+        for mode in fee_engine.ARITHMETIC_MODES:
+            fee_engine.set_arithmetic(mode)
+            results[f'calculate_fees ({mode})'] = measure(
+                lambda: [calculate_fees(*order, fee_data=fee_data) for order in orders], len(orders), repeat)
+    finally:
+        fee_engine.set_arithmetic(previous)
+
+    from quote_cache import QuoteCache
+    cache = QuoteCache(maxsize=len(orders))
+    results['QuoteCache.calculate_fees (hit)'] = measure(
+        lambda: [cache.calculate_fees(*order, fee_data=fee_data) for order in orders], len(orders), repeat)
+
+    try:
+        from batch_engine import calculate_fees_batch, compile_fee_tables
+        from price_solver import solve_price_batch
+    except ImportError:  # NumPy assente: si saltano i percorsi batch
+        return results, orders
+    tables = compile_fee_tables(fee_data)
+    columns = batch_columns(orders)
+    results['compile_fee_tables'] = measure(lambda: compile_fee_tables(fee_data), 1, repeat)
+    results['calculate_fees_batch'] = measure(lambda: calculate_fees_batch(tables, **columns), len(orders), repeat)
+    solver_args = {key: value for key, value in columns.items() if key not in ('item_price', 'item_cost')}
+    results['solve_price_batch'] = measure(
+        lambda: solve_price_batch(tables, item_cost=columns['item_cost'], target_profit=10.0, **solver_args),
+        len(orders), repeat)
+    return results, orders
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Benchmark piu' lenti del riferimento oltre la tolleranza: [(nome, prima us, ora us)]."""
+    slower = []
+    for name, row in results.items():
+        before = baseline.get('results', {}).get(name)
+        if before and row['best_us'] > before['best_us'] * (1 + tolerance):
+            slower.append((name, before['best_us'], row['best_us']))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline commissioni eBay.")
+    parser.add_argument("--orders", type=int, default=DEFAULT_ORDERS)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="es. variable=0.5,tiered=0.3,vehicle=0.2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--fee-file", default=DEFAULT_FEE_FILE)
+    parser.add_argument("--json", help="scrive i risultati in questo file")
+    parser.add_argument("--compare", help="risultati di riferimento (--json di una run precedente)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--profile", help="scrive qui i tempi per fase di calculate_fees (JSON)")
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore")  # categorie sconosciute volute nel mix
+    results, orders = run_benchmarks(args.orders, args.mix, args.seed, args.repeat, args.fee_file)
+    print(f"{'Benchmark':<48}{'ops':>8}{'migliore us/op':>16}{'mediana us/op':>16}")
+    for name, row in results.items():
+        print(f"{name:<48}{row['ops']:>8}{row['best_us']:>16.3f}{row['median_us']:>16.3f}")
+
+    report = {
+        'python': sys.version.split()[0], 'platform': platform.platform(),
+        'workload': {'orders': args.orders, 'mix': args.mix, 'seed': args.seed, 'repeat': args.repeat},
+        'results': results,
+    }
+    if args.profile:
+        profiler = fee_engine.enable_profiling()
+        fee_data = fee_engine.get_fee_data(args.fee_file)
+        for order in orders:
+            calculate_fees(*order, fee_data=fee_data)
+        fee_engine.disable_profiling()
+        print("\n" + profiler.format_table())
+        profiler.export_json(args.profile)
+        report['profile'] = args.profile
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for name, before, now in slower:
+            print(f"REGRESSIONE: {name}: {before:.3f} -> {now:.3f} us/op (+{now / before - 1:.0%})")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Albero categorie eBay locale: propaga gruppi CVF e tariffe veicoli alle foglie.
+
+Il listino elenca solo alcune categorie (spesso di primo livello); le foglie reali degli
+ordini ereditano gruppo e stato veicolo dall'antenato piu' vicino che compare nel listino,
+le altre ricadono nel gruppo di default. Il risultato estende `_category_map` e
+`_vehicle_category_map`: lookup O(1) per ogni ID dell'albero, senza avvisi.
+
+Formati accettati:
+  - CSV/TSV con colonne category_id, parent_id (vuoto o 0 per le radici);
+  - JSON della Taxonomy API (`getCategoryTree`): rootCategoryNode / childCategoryTreeNodes.
+"""
+import csv
+import io
+import json
+
+
+def _parse_json_tree(doc):
+    # La radice della Taxonomy API (ID 0) non e' una categoria: i suoi figli sono le radici
+    root = doc.get('rootCategoryNode', doc)
+    parents = {}
+    stack = [(child, None) for child in root.get('childCategoryTreeNodes', ())]
+    while stack:
+        node, parent = stack.pop()
+        cat_id = int(node['category']['categoryId'])
+        parents[cat_id] = parent
+        stack.extend((child, cat_id) for child in node.get('childCategoryTreeNodes', ()))
+    return parents
+
+
+def parse_category_tree(raw, file_path):
+    """Byte del file -> {category_id: parent_id o None}."""
+    if file_path.lower().endswith(".json"):
+        return _parse_json_tree(json.loads(raw.decode('utf-8')))
+    text = raw.decode('utf-8-sig')
+    delimiter = '\t' if file_path.lower().endswith(".tsv") else ','
+    parents = {}
+    for row in csv.DictReader(io.StringIO(text), delimiter=delimiter):
+        try:
+            cat_id = int(row['category_id'])
+            parent = (row.get('parent_id') or '').strip()
+            parents[cat_id] = int(parent) if parent and parent != '0' else None
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{file_path}: riga non valida {row!r} (attese colonne category_id, parent_id)") from None
+    return parents
+
+
+def propagate_categories(parents, category_map, vehicle_map, default_group):
+    """Estende le due mappe a tutte le categorie dell'albero; restituisce quante ne ha aggiunte.
+
+    Vince l'antenato piu' vicino presente nel listino; una categoria gia' mappata resta com'e'.
+    """
+    children = {}
+    roots = []
+    for cat_id, parent in parents.items():
+        if parent is None or parent not in parents:
+            roots.append(cat_id)
+        else:
+            children.setdefault(parent, []).append(cat_id)
+
+    added, seen = 0, set()
+    stack = [(root, default_group, None) for root in roots]
+    while stack:
+        cat_id, group, vehicle = stack.pop()
+        if cat_id in seen:  # albero malformato (cicli): ogni nodo una volta sola
+            continue
+        seen.add(cat_id)
+        if cat_id in category_map:
+            group = category_map[cat_id]
+            # una categoria elencata in un gruppo CVF non e' un veicolo, anche sotto un ramo veicoli
+            vehicle = vehicle_map.get(cat_id)
+        else:
+            vehicle = vehicle_map.get(cat_id, vehicle)
+            if group is not None:
+                category_map[cat_id] = group; added += 1
+        if cat_id not in vehicle_map and vehicle is not None:
+            vehicle_map[cat_id] = vehicle
+        stack.extend((child, group, vehicle) for child in children.get(cat_id, ()))
+    return added
@@ -0,0 +1,56 @@
+"""Controllo di regressione sul tempo di import a freddo di `fee_engine`.
+
+Uso: python check_import_time.py [budget_ms]
+Esce con codice 1 se l'import supera il budget, tira dentro moduli pesanti
+(Streamlit, NumPy, pandas) o carica il listino tariffe gia' all'import.
+"""
+import json
+import os
+import subprocess
+import sys
+
+BUDGET_MS = 50.0
+RUNS = 5
+HEAVY_MODULES = ("streamlit", "numpy", "pandas")
+
+_PROBE = (
+    "import json, sys, fee_engine; "
+    f"print(json.dumps({{'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules], "
+    "'fee_data_loaded': bool(fee_engine._fee_data_cache)}))"
+)
+
+
+def measure_import(module="fee_engine"):
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE],
+                          cwd=here, capture_output=True, text=True, check=True)
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    return cumulative_us / 1000, json.loads(proc.stdout)
+
+
+def main(budget_ms=BUDGET_MS):
+    timings, probe = [], None
+    for _ in range(RUNS):
+        elapsed_ms, probe = measure_import()
+        timings.append(elapsed_ms)
+    best = min(timings)
+    print(f"import fee_engine: {best:.1f} ms (migliore di {RUNS}, budget {budget_ms:.0f} ms)")
+    failures = []
+    if best > budget_ms:
+        failures.append(f"tempo di import {best:.1f} ms oltre il budget di {budget_ms:.0f} ms")
+    if probe['heavy']:
+        failures.append(f"moduli pesanti importati: {', '.join(probe['heavy'])}")
+    if probe['fee_data_loaded']:
+        failures.append("il listino tariffe viene caricato all'import")
+    for failure in failures:
+        print(f"FALLITO: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS))
@@ -0,0 +1,349 @@
+"""Motore commissioni eBay senza dipendenze da Streamlit.
+
+Importabile da worker, cron job e process pool: il listino tariffe viene
+caricato solo al primo utilizzo (`get_fee_data`) e poi riusato nel processo.
+"""
+import os
+import threading
+import time
+import warnings
+from decimal import Decimal, ROUND_HALF_UP
+
+from tier_schedule import compile_tier_schedule, tiered_fee
+
+DEFAULT_FEE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ebay_professional_fees_it.json")
+DEFAULT_FVF_GROUP = "Other_categories_including_clothing_beauty"
+# Albero categorie eBay opzionale (category_tree.py): usato se il file esiste
+CATEGORY_TREE_FILE = os.environ.get("EBAY_CATEGORY_TREE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "ebay_category_tree_it.csv")
+VEHICLE_FIXED_FVF_TYPES = ("high_value_vehicles", "motorcycles_and_others")
+
+ARITHMETIC_MODES = ("decimal", "cents")
+_arithmetic = os.environ.get("EBAY_FEES_ARITHMETIC", "decimal")
+
+COUNTRY_MAP = {"Italia":"Eurozone_Sweden","Malta":"Eurozone_Sweden","Germania":"Eurozone_Sweden","Francia":"Eurozone_Sweden","Spagna":"Eurozone_Sweden","Svezia":"Eurozone_Sweden",
+               "Regno Unito":"United_Kingdom","Stati Uniti":"United_States_Canada","Canada":"United_States_Canada","Svizzera":"Europe_non_eurozone_Sweden_UK",
+               "Norvegia":"Europe_non_eurozone_Sweden_UK","Altro (Resto del Mondo)":"Rest_of_world"}
+
+# --- Utility Functions ---
+def to_decimal(value, precision='0.01'):
+    return Decimal(str(value)).quantize(Decimal(precision), rounding=ROUND_HALF_UP)
+
+def to_percentage_decimal(value):
+    return Decimal(str(value))
+
+def set_arithmetic(mode):
+    # "decimal": motore di riferimento; "cents": interi in virgola fissa (fee_engine_cents), stessi risultati
+    global _arithmetic
+    if mode not in ARITHMETIC_MODES:
+        raise ValueError(f"Aritmetica sconosciuta {mode!r}, attese: {', '.join(ARITHMETIC_MODES)}")
+    _arithmetic = mode
+
+def get_arithmetic():
+    return _arithmetic
+
+_profiler = None
+
+def enable_profiling():
+    # Tempi per fase di calculate_fees (fee_profiling.StageProfiler); restituisce il profiler attivo
+    global _profiler
+    if _profiler is None:
+        from fee_profiling import StageProfiler
+        _profiler = StageProfiler()
+    return _profiler
+
+def disable_profiling():
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+# --- Load Fee Data ---
+INTL_FEE_KEYS = tuple(sorted(set(COUNTRY_MAP.values()) | {"Rest_of_world"}))
+
+def compile_fee_data(data, category_tree=None):
+    # Strutture derivate usate dal calcolo: scaglioni compilati e mappe categoria -> gruppo/veicolo
+    category_to_fvf_group = {}
+    for group in data['final_value_fees']:
+        if 'tiers' in group:
+            group['_schedule'] = compile_tier_schedule(group['tiers'])
+        for cat_id in group['category_ids']:
+            category_to_fvf_group[cat_id] = group
+    data['_category_map'] = category_to_fvf_group
+    data['_default_fvf_group'] = next((g for g in data['final_value_fees'] if g['group'] == DEFAULT_FVF_GROUP), None)
+
+    vehicle_cats = {}
+    for key, vehicle_item_data in data['vehicles'].items():
+        if isinstance(vehicle_item_data, dict) and 'category_ids' in vehicle_item_data:
+            if 'insertion_fee' in vehicle_item_data and 'final_value_fee' in vehicle_item_data:
+                for cat_id in vehicle_item_data['category_ids']:
+                    vehicle_cats[cat_id] = {
+                        "type": key,
+                        "insertion_fee": to_decimal(vehicle_item_data['insertion_fee']),
+                        "final_value_fee": to_decimal(vehicle_item_data['final_value_fee'])
+                    }
+            else:
+                warnings.warn(f"Dati incompleti per il tipo di veicolo '{key}' nel JSON.")
+    data['_vehicle_category_map'] = vehicle_cats
+
+    if category_tree is not None:
+        from category_tree import propagate_categories
+        propagate_categories(category_tree, category_to_fvf_group, vehicle_cats, data['_default_fvf_group'])
+    return data
+
+def load_fee_data(file_path=DEFAULT_FEE_FILE, use_snapshot=True, category_tree_file=None):
+    """Listino JSON o YAML, validato e compilato; usa lo snapshot se corrisponde ai file.
+
+    Se c'e' l'albero categorie (default: CATEGORY_TREE_FILE, se esiste) le sue foglie
+    ereditano gruppo CVF e stato veicolo dagli antenati.
+    """
+    import hashlib  # solo al caricamento: non pesa sull'import del modulo
+    from fee_schedule import parse_fee_source, read_snapshot, snapshot_path, validate_fee_data
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    hasher = hashlib.sha256(raw)
+    tree_file = category_tree_file or CATEGORY_TREE_FILE
+    tree_raw = None
+    if category_tree_file or os.path.exists(tree_file):
+        with open(tree_file, 'rb') as f:
+            tree_raw = f.read()
+        hasher.update(tree_raw)
+    digest = hasher.hexdigest()
+    if use_snapshot:
+        data = read_snapshot(snapshot_path(file_path), digest)
+        if data is not None:
+            return data
+    data = validate_fee_data(parse_fee_source(raw, file_path), INTL_FEE_KEYS)
+    # Identifica il listino (data di generazione + hash dei file): usato per invalidare le cache
+    data['_fingerprint'] = (data.get('generated_on'), digest)
+    category_tree = None
+    if tree_raw is not None:
+        from category_tree import parse_category_tree
+        category_tree = parse_category_tree(tree_raw, tree_file)
+    return compile_fee_data(data, category_tree)
+
+_fee_data_cache = {}
+_fee_data_stamps = {}
+_fee_data_lock = threading.Lock()
+_reload_interval = float(os.environ.get("EBAY_FEES_RELOAD_INTERVAL", 0))
+_next_reload_check = {}
+
+def _file_stamp(file_path):
+    st = os.stat(file_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    if os.path.exists(CATEGORY_TREE_FILE):
+        tree = os.stat(CATEGORY_TREE_FILE)
+        stamp += (tree.st_mtime_ns, tree.st_size)
+    return stamp
+
+def get_fee_data(file_path=DEFAULT_FEE_FILE):
+    data = _fee_data_cache.get(file_path)
+    if data is None:
+        with _fee_data_lock:
+            data = _fee_data_cache.get(file_path)
+            if data is None:
+                stamp = _file_stamp(file_path)
+                data = _fee_data_cache[file_path] = load_fee_data(file_path)
+                _fee_data_stamps[file_path] = stamp
+    elif _reload_interval and time.monotonic() >= _next_reload_check.get(file_path, 0):
+        _next_reload_check[file_path] = time.monotonic() + _reload_interval
+        reload_fee_data(file_path)
+        data = _fee_data_cache[file_path]
+    return data
+
+def reload_fee_data(file_path=DEFAULT_FEE_FILE):
+    """Ricarica il listino se il file e' cambiato (mtime/dimensione, poi hash). True se sostituito.
+
+    La sostituzione e' un singolo assegnamento: i calcoli in corso finiscono con il listino
+    che hanno gia' in mano. Un file non valido (es. scritto a meta') viene segnalato e ignorato.
+    """
+    with _fee_data_lock:
+        current = _fee_data_cache.get(file_path)
+        try:
+            stamp = _file_stamp(file_path)
+            if current is not None and stamp == _fee_data_stamps.get(file_path):
+                return False
+            data = load_fee_data(file_path)
+        except (OSError, ValueError) as exc:
+            if current is None:
+                raise
+            warnings.warn(f"Listino {file_path} non ricaricato, resta quello del {current.get('generated_on')}: {exc}")
+            return False
+        _fee_data_stamps[file_path] = stamp
+        if current is not None and data['_fingerprint'] == current['_fingerprint']:
+            return False
+        _fee_data_cache[file_path] = data
+        return True
+
+def set_reload_interval(seconds):
+    # 0 = nessun controllo automatico; altrimenti get_fee_data verifica il file al massimo ogni `seconds`
+    global _reload_interval
+    _reload_interval = float(seconds)
+    _next_reload_check.clear()
+
+def __getattr__(name):
+    # FEE_DATA resta disponibile come attributo del modulo, ma caricato pigramente
+    if name == "FEE_DATA":
+        return get_fee_data()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Calculation Functions ---
+
+def resolve_fvf_group(category_id, fee_data=None):
+    # Gruppo CVF della categoria; le categorie sconosciute ricadono su 'Altre categorie' (None se manca)
+    if fee_data is None: fee_data = get_fee_data()
+    fvf_group_data = fee_data['_category_map'].get(category_id)
+    if not fvf_group_data:
+        warnings.warn(f"ID Cat. {category_id} non trovato, default 'Altre cat.'")
+        fvf_group_data = fee_data['_default_fvf_group']
+    return fvf_group_data
+
+def get_final_value_fee_rate_and_group(category_id, total_sale_price, fee_data=None):
+    if fee_data is None: fee_data = get_fee_data()
+    total_sale_price_dec = to_decimal(total_sale_price)
+    if category_id in fee_data['_vehicle_category_map']:
+        vehicle_info = fee_data['_vehicle_category_map'][category_id]
+        if vehicle_info['type'] in VEHICLE_FIXED_FVF_TYPES:
+            return vehicle_info['final_value_fee'], f"Veicoli ({vehicle_info['type']})", False 
+    fvf_group_data = resolve_fvf_group(category_id, fee_data)
+    if not fvf_group_data: return Decimal('0'), "Cat. non trovata", False
+    group_name = fvf_group_data['group']
+    if 'variable_rate' in fvf_group_data:
+        return total_sale_price_dec * to_percentage_decimal(fvf_group_data['variable_rate']), group_name, False
+    elif 'tiers' in fvf_group_data:
+        return tiered_fee(fvf_group_data['_schedule'], total_sale_price_dec), group_name, True
+    return Decimal('0'), "Sconosciuto", False
+
+def calculate_fees(item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost, # NUOVO PARAMETRO
+                   category_id, buyer_country, seller_status, high_inad_surcharge, 
+                   store_subscription, num_listings_this_month, listing_type, 
+                   add_subtitle, reserve_price_value, use_reserve_price,
+                   apply_vat, vat_rate_input, fee_data=None):
+    if _arithmetic == "cents":
+        from fee_engine_cents import calculate_fees_cents as engine
+    else:
+        engine = calculate_fees_decimal
+    profiler = _profiler
+    if profiler is not None: start = time.perf_counter_ns()
+    results = engine(item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                     category_id, buyer_country, seller_status, high_inad_surcharge,
+                     store_subscription, num_listings_this_month, listing_type,
+                     add_subtitle, reserve_price_value, use_reserve_price,
+                     apply_vat, vat_rate_input, fee_data)
+    if profiler is not None: profiler.lap("total", start)
+    return results
+
+def calculate_fees_decimal(item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                           category_id, buyer_country, seller_status, high_inad_surcharge,
+                           store_subscription, num_listings_this_month, listing_type,
+                           add_subtitle, reserve_price_value, use_reserve_price,
+                           apply_vat, vat_rate_input, fee_data=None):
+    if fee_data is None: fee_data = get_fee_data()
+    profiler = _profiler
+    if profiler is not None: lap = time.perf_counter_ns()
+    results = {}
+    total_fees_pre_vat = Decimal('0')
+
+    item_price_dec = to_decimal(item_price)
+    shipping_charged_dec = to_decimal(shipping_charged_to_customer) # Questo è ciò che il cliente paga per la spedizione
+    item_cost_dec = to_decimal(item_cost)
+    your_actual_shipping_cost_dec = to_decimal(your_actual_shipping_cost) # NUOVO: costo reale spedizione
+
+    total_sale_price_dec = item_price_dec + shipping_charged_dec # Le commissioni eBay si basano su questo
+    results['total_sale_price'] = total_sale_price_dec
+    results['item_cost'] = item_cost_dec
+    results['your_actual_shipping_cost'] = your_actual_shipping_cost_dec # Memorizza per display
+
+    is_vehicle_fixed_fvf = False 
+    if category_id in fee_data['_vehicle_category_map']:
+        vehicle_info = fee_data['_vehicle_category_map'][category_id]
+        if vehicle_info['type'] in VEHICLE_FIXED_FVF_TYPES:
+            base_fvf_amount = vehicle_info['final_value_fee']; fvf_group_name = f"Veicoli ({vehicle_info['type']})"
+            results['fvf_calculation_details'] = f"Tariffa fissa per {fvf_group_name}"; is_vehicle_fixed_fvf = True
+        else: 
+            base_fvf_amount, fvf_group_name, _ = get_final_value_fee_rate_and_group(category_id, total_sale_price_dec, fee_data)
+            results['fvf_calculation_details'] = f"Tariffa {'a scaglioni' if _ else 'variabile'} per '{fvf_group_name}'" # _ is is_tiered
+    else:
+        base_fvf_amount, fvf_group_name, _ = get_final_value_fee_rate_and_group(category_id, total_sale_price_dec, fee_data)
+        results['fvf_calculation_details'] = f"Tariffa {'a scaglioni' if _ else 'variabile'} per '{fvf_group_name}'"
+
+    base_fvf_amount = to_decimal(base_fvf_amount)
+    results['base_fvf_amount_raw'] = base_fvf_amount; results['fvf_group_name'] = fvf_group_name
+    results['is_vehicle_fixed_fvf'] = is_vehicle_fixed_fvf
+    if profiler is not None: lap = profiler.lap("fvf", lap)
+
+    effective_fvf = base_fvf_amount; results['fvf_discounts_surcharges'] = []
+    if not is_vehicle_fixed_fvf:
+        if seller_status == "Venditore Affidabilità Top":
+            disc_rate = to_percentage_decimal(fee_data['discounts_surcharges']['top_rated_seller_discount_rate'])
+            disc_amt = base_fvf_amount * abs(disc_rate); effective_fvf -= disc_amt
+            results['fvf_discounts_surcharges'].append({"name": "Sconto Venditore Affidabilità Top","rate_on_fvf": abs(disc_rate)*100,"amount": -disc_amt})
+        if high_inad_surcharge:
+            sur_rate = to_percentage_decimal(fee_data['discounts_surcharges']['high_INAD_surcharge_rate'])
+            sur_amt = base_fvf_amount * sur_rate; effective_fvf += sur_amt
+            results['fvf_discounts_surcharges'].append({"name": "Sovraccarico per controversie 'Non conforme'","rate_on_fvf": sur_rate*100,"amount": sur_amt})
+        if seller_status == "Sotto lo standard":
+            sur_rate = to_percentage_decimal(fee_data['discounts_surcharges']['below_standard_surcharge_rate'])
+            sur_amt = base_fvf_amount * sur_rate; effective_fvf += sur_amt
+            results['fvf_discounts_surcharges'].append({"name": "Sovraccarico Venditore Sotto lo Standard","rate_on_fvf": sur_rate*100,"amount": sur_amt})
+    
+    results['final_value_fee'] = to_decimal(effective_fvf); total_fees_pre_vat += results['final_value_fee']
+    if profiler is not None: lap = profiler.lap("surcharges", lap)
+    results['regulatory_fee'] = to_decimal(total_sale_price_dec * to_percentage_decimal(fee_data['constants']['regulatory_compliance_fee_rate'])); total_fees_pre_vat += results['regulatory_fee']
+    if profiler is not None: lap = profiler.lap("regulatory", lap)
+    
+    intl_key = COUNTRY_MAP.get(buyer_country, "Rest_of_world")
+    intl_rate = to_percentage_decimal(fee_data['international_fee_rates'][intl_key])
+    results['international_fee'] = to_decimal(total_sale_price_dec * intl_rate); total_fees_pre_vat += results['international_fee']
+    results['international_fee_details'] = f"Paese: {buyer_country}, Tariffa: {intl_rate*100:.1f}% ({intl_key})"
+    results['fixed_order_fee'] = to_decimal(fee_data['constants']['fixed_order_fee_eur']); total_fees_pre_vat += results['fixed_order_fee']
+    if profiler is not None: lap = profiler.lap("international", lap)
+
+    insertion_fee = Decimal('0'); insertion_fee_details = "N/A"; is_vehicle_insertion = False
+    if category_id in fee_data['_vehicle_category_map']:
+        vehicle_info_insert = fee_data['_vehicle_category_map'][category_id]
+        if 'insertion_fee' in vehicle_info_insert:
+            insertion_fee = vehicle_info_insert['insertion_fee']
+            insertion_fee_details = f"Fissa veicoli ({vehicle_info_insert['type']})"; is_vehicle_insertion = True
+    if not is_vehicle_insertion:
+        key = "auction" if listing_type=="Asta" else "buy_it_now"
+        if store_subscription=="Nessuno":
+            insertion_fee = to_decimal(fee_data['insertion_fees']['non_store'][key])
+            insertion_fee_details = f"'{listing_type}' no negozio"
+        else:
+            store = fee_data['insertion_fees']['store_subscriptions'][store_subscription]
+            free_key = f"free_{key}_listings"; extra_key = f"extra_listing_fee_{key}"
+            allowance = store.get(free_key)
+            if allowance=="unlimited": insertion_fee_details = f"Illimitate '{listing_type}' ({store_subscription})"
+            elif isinstance(allowance,int) and num_listings_this_month > allowance:
+                insertion_fee=to_decimal(store[extra_key]); insertion_fee_details=f"Extra '{listing_type}' ({store_subscription}, >{allowance})"
+            elif isinstance(allowance,int): insertion_fee_details=f"Gratuita '{listing_type}' ({store_subscription}, quota {allowance})"
+            else: insertion_fee=to_decimal(store.get(extra_key,'0')); insertion_fee_details=f"'{listing_type}' ({store_subscription})"
+    results['insertion_fee']=insertion_fee; results['insertion_fee_details']=insertion_fee_details; total_fees_pre_vat+=insertion_fee
+    if profiler is not None: lap = profiler.lap("insertion", lap)
+    
+    results['listing_upgrades_fees']=[]; upgrade_total=Decimal('0')
+    if add_subtitle:
+        sub_fee=to_decimal(fee_data['listing_upgrades']['subtitle']); results['listing_upgrades_fees'].append({"name":"Sottotitolo","fee":sub_fee}); upgrade_total+=sub_fee
+    if use_reserve_price and reserve_price_value > 0 and listing_type=="Asta":
+        is_veh_reserve = category_id in fee_data['_vehicle_category_map']
+        if is_veh_reserve and "vehicle_reserve_price_fee" in fee_data['vehicles']:
+            res_fee=to_decimal(fee_data['vehicles']['vehicle_reserve_price_fee']); res_detail=f"Fissa veicoli: {res_fee}€"
+        else: 
+            rp_cfg=fee_data['listing_upgrades']['reserve_price']; res_val=to_decimal(reserve_price_value)
+            res_fee=max(to_decimal(rp_cfg['min_fee']),min(to_decimal(rp_cfg['max_fee']),res_val*to_percentage_decimal(rp_cfg['percentage_rate'])))
+            res_detail=f"{rp_cfg['percentage_rate']*100}% su {res_val}€ (min {rp_cfg['min_fee']}€, max {rp_cfg['max_fee']}€)"
+        results['listing_upgrades_fees'].append({"name":f"Riserva ({res_detail})","fee":res_fee}); upgrade_total+=res_fee
+    results['listing_upgrade_total_fee']=upgrade_total; total_fees_pre_vat+=upgrade_total
+    if profiler is not None: lap = profiler.lap("upgrades", lap)
+
+    results['total_fees_pre_vat'] = to_decimal(total_fees_pre_vat); vat_amount = Decimal('0')
+    if apply_vat:
+        vat_amount = to_decimal(results['total_fees_pre_vat'] * to_percentage_decimal(vat_rate_input/100))
+    results['vat_amount']=vat_amount; results['total_fees_incl_vat']=results['total_fees_pre_vat']+vat_amount
+    
+    # AGGIORNAMENTO CALCOLO PROFITTO
+    results['net_profit'] = total_sale_price_dec - item_cost_dec - your_actual_shipping_cost_dec - results['total_fees_incl_vat']
+    results['profit_if_vat_reclaimed'] = total_sale_price_dec - item_cost_dec - your_actual_shipping_cost_dec - results['total_fees_pre_vat']
+    if profiler is not None: profiler.lap("vat", lap)
+    
+    return results
@@ -0,0 +1,293 @@
+"""Motore scalare in virgola fissa: importi in centesimi interi, aliquote in milionesimi.
+
+Stessi risultati di `fee_engine.calculate_fees` (stesso dict, valori Decimal
+numericamente identici), ma l'aritmetica del percorso caldo e' tutta su interi:
+ROUND_HALF_UP viene riprodotto esattamente nei punti in cui il motore Decimal
+quantizza. Si attiva con `fee_engine.set_arithmetic("cents")` o con la variabile
+d'ambiente EBAY_FEES_ARITHMETIC=cents.
+"""
+import threading
+import warnings
+from bisect import bisect_right
+from decimal import Decimal
+
+from fee_engine import (COUNTRY_MAP, VEHICLE_FIXED_FVF_TYPES, get_fee_data,
+                        to_decimal, to_percentage_decimal)
+
+RATE_SCALE = 10**6
+_ZERO = Decimal('0')
+_tables_lock = threading.Lock()
+_vat_ratios = {}  # aliquota IVA (%) -> frazione esatta di Decimal(str(aliquota/100))
+
+
+# --- Fixed-point helpers ---
+def to_cents(value):
+    """Come `to_decimal(value)` (ROUND_HALF_UP al centesimo) ma restituisce un int."""
+    if type(value) is int:
+        return value * 100
+    text = str(value)
+    negative = text[:1] == '-'
+    whole, dot, frac = (text[1:] if negative or text[:1] == '+' else text).partition('.')
+    if not whole.isdecimal() or (dot and not frac.isdecimal()):
+        # spazi, esponenti, nan/inf, '1.', '.5', ...: decide Decimal, come in to_decimal
+        return int(to_decimal(value).scaleb(2))
+    cents = int(whole) * 100 + int(frac[:2].ljust(2, '0'))
+    if len(frac) > 2 and frac[2] >= '5':  # la parte scartata e' >= mezzo centesimo
+        cents += 1
+    return -cents if negative else cents
+
+
+def rate_units(value):
+    units = to_percentage_decimal(value) * RATE_SCALE
+    if units != units.to_integral_value():
+        raise ValueError(f"Aliquota {value} non rappresentabile con scala {RATE_SCALE}")
+    return int(units)
+
+
+def div_round_half_up(numerator, denominator):
+    # ROUND_HALF_UP (lontano da zero) su interi Python, denominatore positivo
+    if numerator >= 0:
+        return (2 * numerator + denominator) // (2 * denominator)
+    return -((-2 * numerator + denominator) // (2 * denominator))
+
+
+def _dec(cents, _scaleb=Decimal.scaleb):
+    return _scaleb(Decimal(cents), -2)
+
+
+# --- Table compilation ---
+def _compile_group(group):
+    if group is None:
+        return ("Cat. non trovata", False, (0,), (0,), (0,))
+    if 'variable_rate' in group:
+        return (group['group'], False, (0,), (rate_units(group['variable_rate']),), (0,))
+    if 'tiers' in group:
+        schedule = group['_schedule']
+        breakpoints = tuple(int(bp.scaleb(2)) for bp in schedule.breakpoints)
+        rates = tuple(rate_units(rate) for rate in schedule.rates)
+        cumulative = [0]
+        for k in range(1, len(breakpoints)):
+            cumulative.append(cumulative[-1] + (breakpoints[k] - breakpoints[k - 1]) * rates[k - 1])
+        return (group['group'], True, breakpoints, rates, tuple(cumulative))
+    return ("Sconosciuto", False, (0,), (0,), (0,))
+
+
+def compile_cents_tables(fee_data):
+    groups = {id(group): _compile_group(group) for group in fee_data['final_value_fees']}
+    default = fee_data['_default_fvf_group']
+    ds = fee_data['discounts_surcharges']
+    top_rate = abs(to_percentage_decimal(ds['top_rated_seller_discount_rate']))
+    inad_rate = to_percentage_decimal(ds['high_INAD_surcharge_rate'])
+    below_rate = to_percentage_decimal(ds['below_standard_surcharge_rate'])
+    intl = {}
+    for key, rate in fee_data['international_fee_rates'].items():
+        intl[key] = (rate_units(rate), f"{to_percentage_decimal(rate)*100:.1f}")
+    stores = {}
+    for name, store in fee_data['insertion_fees']['store_subscriptions'].items():
+        stores[name] = {key: (store.get(f"free_{key}_listings"), store.get(f"extra_listing_fee_{key}", '0'))
+                        for key in ("buy_it_now", "auction")}
+    return {
+        'category_groups': {cat_id: groups[id(group)] for cat_id, group in fee_data['_category_map'].items()},
+        'default_group': groups[id(default)] if default is not None else _compile_group(None),
+        'vehicles': {cat_id: (info['type'], to_cents(info['insertion_fee']), to_cents(info['final_value_fee']),
+                              info['type'] in VEHICLE_FIXED_FVF_TYPES)
+                     for cat_id, info in fee_data['_vehicle_category_map'].items()},
+        'top_rated': (rate_units(top_rate), top_rate), 'high_inad': (rate_units(inad_rate), inad_rate),
+        'below_standard': (rate_units(below_rate), below_rate),
+        'regulatory': rate_units(fee_data['constants']['regulatory_compliance_fee_rate']),
+        'intl': intl, 'fixed_order_fee': to_cents(fee_data['constants']['fixed_order_fee_eur']),
+        'non_store': {key: to_cents(fee) for key, fee in fee_data['insertion_fees']['non_store'].items()},
+        'stores': stores, 'subtitle': to_cents(fee_data['listing_upgrades']['subtitle']),
+    }
+
+
+def get_cents_tables(fee_data):
+    # Compilate una volta per listino e memorizzate accanto ai dati (come _category_map)
+    tables = fee_data.get('_cents_tables')
+    if tables is None:
+        with _tables_lock:
+            tables = fee_data.get('_cents_tables')
+            if tables is None:
+                tables = fee_data['_cents_tables'] = compile_cents_tables(fee_data)
+    return tables
+
+
+# --- Calculation ---
+def calculate_fees_cents(item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                         category_id, buyer_country, seller_status, high_inad_surcharge,
+                         store_subscription, num_listings_this_month, listing_type,
+                         add_subtitle, reserve_price_value, use_reserve_price,
+                         apply_vat, vat_rate_input, fee_data=None):
+    if fee_data is None: fee_data = get_fee_data()
+    t = get_cents_tables(fee_data)
+    results = {}
+
+    total_c = to_cents(item_price) + to_cents(shipping_charged_to_customer)
+    item_cost_c = to_cents(item_cost)
+    actual_shipping_c = to_cents(your_actual_shipping_cost)
+    results['total_sale_price'] = _dec(total_c)
+    results['item_cost'] = _dec(item_cost_c)
+    results['your_actual_shipping_cost'] = _dec(actual_shipping_c)
+
+    vehicle = t['vehicles'].get(category_id)
+    is_vehicle_fixed_fvf = vehicle is not None and vehicle[3]
+    if is_vehicle_fixed_fvf:
+        base_fvf_c = vehicle[2]; fvf_group_name = f"Veicoli ({vehicle[0]})"
+        results['fvf_calculation_details'] = f"Tariffa fissa per {fvf_group_name}"
+    else:
+        group = t['category_groups'].get(category_id)
+        if group is None:
+            warnings.warn(f"ID Cat. {category_id} non trovato, default 'Altre cat.'")
+            group = t['default_group']
+        fvf_group_name, is_tiered, breakpoints, rates, cumulative = group
+        i = max(bisect_right(breakpoints, total_c) - 1, 0)
+        base_fvf_c = div_round_half_up(cumulative[i] + (total_c - breakpoints[i]) * rates[i], RATE_SCALE)
+        results['fvf_calculation_details'] = f"Tariffa {'a scaglioni' if is_tiered else 'variabile'} per '{fvf_group_name}'"
+    results['base_fvf_amount_raw'] = _dec(base_fvf_c); results['fvf_group_name'] = fvf_group_name
+    results['is_vehicle_fixed_fvf'] = is_vehicle_fixed_fvf
+
+    adjustment = 0; results['fvf_discounts_surcharges'] = []
+    if not is_vehicle_fixed_fvf:
+        # dettagli (importi non arrotondati) in Decimal, come il motore di riferimento
+        base_dec = results['base_fvf_amount_raw']
+        if seller_status == "Venditore Affidabilità Top":
+            units, rate = t['top_rated']; adjustment -= units
+            results['fvf_discounts_surcharges'].append({"name": "Sconto Venditore Affidabilità Top","rate_on_fvf": rate*100,"amount": -(base_dec * rate)})
+        if high_inad_surcharge:
+            units, rate = t['high_inad']; adjustment += units
+            results['fvf_discounts_surcharges'].append({"name": "Sovraccarico per controversie 'Non conforme'","rate_on_fvf": rate*100,"amount": base_dec * rate})
+        if seller_status == "Sotto lo standard":
+            units, rate = t['below_standard']; adjustment += units
+            results['fvf_discounts_surcharges'].append({"name": "Sovraccarico Venditore Sotto lo Standard","rate_on_fvf": rate*100,"amount": base_dec * rate})
+    final_fvf_c = div_round_half_up(base_fvf_c * (RATE_SCALE + adjustment), RATE_SCALE) if adjustment else base_fvf_c
+    regulatory_c = div_round_half_up(total_c * t['regulatory'], RATE_SCALE)
+    intl_key = COUNTRY_MAP.get(buyer_country, "Rest_of_world")
+    intl_units, intl_pct = t['intl'][intl_key]
+    international_c = div_round_half_up(total_c * intl_units, RATE_SCALE)
+    results['final_value_fee'] = _dec(final_fvf_c)
+    results['regulatory_fee'] = _dec(regulatory_c)
+    results['international_fee'] = _dec(international_c)
+    results['international_fee_details'] = f"Paese: {buyer_country}, Tariffa: {intl_pct}% ({intl_key})"
+    results['fixed_order_fee'] = _dec(t['fixed_order_fee'])
+
+    if vehicle is not None:
+        insertion_c = vehicle[1]; insertion_fee_details = f"Fissa veicoli ({vehicle[0]})"
+    else:
+        key = "auction" if listing_type=="Asta" else "buy_it_now"
+        insertion_c = 0
+        if store_subscription=="Nessuno":
+            insertion_c = t['non_store'][key]; insertion_fee_details = f"'{listing_type}' no negozio"
+        else:
+            allowance, extra = t['stores'][store_subscription][key]
+            if allowance=="unlimited": insertion_fee_details = f"Illimitate '{listing_type}' ({store_subscription})"
+            elif isinstance(allowance,int) and num_listings_this_month > allowance:
+                insertion_c = to_cents(extra); insertion_fee_details = f"Extra '{listing_type}' ({store_subscription}, >{allowance})"
+            elif isinstance(allowance,int): insertion_fee_details = f"Gratuita '{listing_type}' ({store_subscription}, quota {allowance})"
+            else: insertion_c = to_cents(extra); insertion_fee_details = f"'{listing_type}' ({store_subscription})"
+    results['insertion_fee'] = _dec(insertion_c); results['insertion_fee_details'] = insertion_fee_details
+
+    # Opzioni: la riserva percentuale resta non arrotondata fino al totale -> unita' cent*RATE_SCALE
+    results['listing_upgrades_fees'] = []; upgrades_units = 0
+    if add_subtitle:
+        results['listing_upgrades_fees'].append({"name":"Sottotitolo","fee":_dec(t['subtitle'])}); upgrades_units += t['subtitle'] * RATE_SCALE
+    if use_reserve_price and reserve_price_value > 0 and listing_type=="Asta":
+        if vehicle is not None and "vehicle_reserve_price_fee" in fee_data['vehicles']:
+            res_fee=to_decimal(fee_data['vehicles']['vehicle_reserve_price_fee']); res_detail=f"Fissa veicoli: {res_fee}€"
+        else:
+            rp_cfg=fee_data['listing_upgrades']['reserve_price']; res_val=to_decimal(reserve_price_value)
+            res_fee=max(to_decimal(rp_cfg['min_fee']),min(to_decimal(rp_cfg['max_fee']),res_val*to_percentage_decimal(rp_cfg['percentage_rate'])))
+            res_detail=f"{rp_cfg['percentage_rate']*100}% su {res_val}€ (min {rp_cfg['min_fee']}€, max {rp_cfg['max_fee']}€)"
+        results['listing_upgrades_fees'].append({"name":f"Riserva ({res_detail})","fee":res_fee})
+        upgrades_units += int(res_fee.scaleb(8))  # cent*1e6: esatto per aliquote fino a 6 decimali
+    results['listing_upgrade_total_fee'] = Decimal(upgrades_units).scaleb(-8) if upgrades_units else _ZERO
+
+    pre_vat_c = final_fvf_c + regulatory_c + international_c + t['fixed_order_fee'] + insertion_c
+    if upgrades_units:
+        pre_vat_c = div_round_half_up(pre_vat_c * RATE_SCALE + upgrades_units, RATE_SCALE)
+    vat_c = 0
+    if apply_vat:
+        ratio = _vat_ratios.get(vat_rate_input)
+        if ratio is None:
+            ratio = _vat_ratios[vat_rate_input] = to_percentage_decimal(vat_rate_input/100).as_integer_ratio()
+        num, den = ratio
+        vat_c = div_round_half_up(pre_vat_c * num, den)
+    results['total_fees_pre_vat'] = _dec(pre_vat_c)
+    results['vat_amount'] = _dec(vat_c) if apply_vat else _ZERO
+    results['total_fees_incl_vat'] = _dec(pre_vat_c + vat_c)
+    results['net_profit'] = _dec(total_c - item_cost_c - actual_shipping_c - pre_vat_c - vat_c)
+    results['profit_if_vat_reclaimed'] = _dec(total_c - item_cost_c - actual_shipping_c - pre_vat_c)
+    return results
+
+
+# --- Differential check ---
+_RESULT_FIELDS = (
+    "total_sale_price", "item_cost", "your_actual_shipping_cost", "base_fvf_amount_raw", "fvf_group_name",
+    "fvf_calculation_details", "is_vehicle_fixed_fvf", "fvf_discounts_surcharges", "final_value_fee",
+    "regulatory_fee", "international_fee", "international_fee_details", "fixed_order_fee", "insertion_fee",
+    "insertion_fee_details", "listing_upgrades_fees", "listing_upgrade_total_fee", "total_fees_pre_vat",
+    "vat_amount", "total_fees_incl_vat", "net_profit", "profit_if_vat_reclaimed",
+)
+
+
+def price_grid(fee_data, max_eur=3000, step_cents=11, window_cents=300):
+    """Griglia in centesimi: passo fisso fino a max_eur, ogni centesimo attorno alle soglie degli scaglioni."""
+    cents = set(range(0, max_eur * 100 + 1, step_cents))
+    for group in fee_data['final_value_fees']:
+        for bp in group.get('_schedule', ((),))[0]:
+            bp_c = int(bp.scaleb(2))
+            cents.update(range(max(bp_c - window_cents, 0), bp_c + window_cents + 1))
+    return sorted(cents)
+
+
+# importi come arrivano da CSV/JSON ({0} euro, {1} centesimi, {2} totale in centesimi, {3} float):
+# spazi (anche dentro le prime due cifre decimali, es. "1.5 "), segno, esponente, zeri in coda
+_PRICE_TEXTS = ("{0}.{1:02d}", "{3} ", " {0}.{1:02d}\n", "{3}\n", "+{0}.{1:02d} ", "{2}e-2", "{0}.{1:02d}0\t",
+                "{0}.{1:02d}5")
+
+
+def differential_check(fee_data=None, max_eur=3000, step_cents=11, window_cents=300, limit=50):
+    """Confronta `calculate_fees_cents` con il motore Decimal su tutta la griglia, per ogni gruppo CVF.
+
+    Gli altri input ruotano su stato venditore, paese, INAD, negozio, tipo inserzione, opzioni e IVA.
+    Restituisce (confronti eseguiti, prime `limit` discrepanze).
+    """
+    from fee_engine import calculate_fees_decimal
+    if fee_data is None: fee_data = get_fee_data()
+    categories = [group['category_ids'][0] for group in fee_data['final_value_fees'] if group['category_ids']]
+    vehicles = fee_data['_vehicle_category_map']
+    categories += sorted({min(c for c, v in vehicles.items() if v['type'] == t) for t in {v['type'] for v in vehicles.values()}})
+    categories.append(-1)  # categoria sconosciuta -> gruppo di default
+    statuses = ["Standard", "Venditore Affidabilità Top", "Sotto lo standard"]
+    countries = list(COUNTRY_MAP) + ["Giappone"]
+    stores = ["Nessuno"] + list(fee_data['insertion_fees']['store_subscriptions'])
+    vat_rates = [22.0, 21.5, 14.3, 0.0]
+    grid = price_grid(fee_data, max_eur, step_cents, window_cents)
+    checked, mismatches = 0, []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for category_id in categories:
+            for n, price_c in enumerate(grid):
+                text = _PRICE_TEXTS[n // 2 % len(_PRICE_TEXTS)].format(price_c // 100, price_c % 100, price_c, price_c / 100)
+                shipping = (n % 7) * 1.495
+                args = (
+                    price_c / 100 if n % 2 else text, f" {shipping}\n" if n % 3 == 0 else shipping, (n % 13) * 10.005, (n % 5) * 2.5,
+                    category_id, countries[n % len(countries)], statuses[n % 3], n % 4 == 0,
+                    stores[n % len(stores)], (0, 41, 101, 251, 401, 10001)[n % 6], "Asta" if n % 2 else "Compralo Subito",
+                    n % 3 == 0, (n % 600) * 1.37, n % 5 != 0, n % 9 != 0, vat_rates[n % len(vat_rates)],
+                )
+                expected = calculate_fees_decimal(*args, fee_data=fee_data)
+                got = calculate_fees_cents(*args, fee_data=fee_data)
+                checked += 1
+                for field in _RESULT_FIELDS:
+                    if expected[field] != got[field]:
+                        mismatches.append({'args': args, 'field': field, 'decimal': expected[field], 'cents': got[field]})
+                        if len(mismatches) >= limit:
+                            return checked, mismatches
+    return checked, mismatches
+
+
+if __name__ == "__main__":
+    checked, found = differential_check()
+    print(f"Confronti: {checked}, discrepanze cents/Decimal: {len(found)}")
+    for mismatch in found:
+        print(mismatch)
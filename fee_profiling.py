@@ -0,0 +1,62 @@
+"""Profilazione per fasi di `calculate_fees` (attivabile, esportabile in JSON).
+
+    import fee_engine
+    profiler = fee_engine.enable_profiling()
+    ...  # calcoli reali
+    profiler.export_json("profilo.json")
+    fee_engine.disable_profiling()
+
+Le fasi sono misurate nel motore Decimal; "total" copre la chiamata intera con
+qualunque aritmetica. Da disattivata costa un controllo `is None` per fase.
+"""
+import json
+import threading
+import time
+
+STAGES = ("fvf", "surcharges", "regulatory", "international", "insertion", "upgrades", "vat")
+
+
+class StageProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.totals_ns = {}
+            self.counts = {}
+            self.started = time.time()
+
+    def lap(self, stage, start_ns):
+        """Accumula il tempo da `start_ns` a ora sulla fase; restituisce l'istante attuale."""
+        now = time.perf_counter_ns()
+        with self._lock:
+            self.totals_ns[stage] = self.totals_ns.get(stage, 0) + now - start_ns
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+        return now
+
+    def report(self):
+        with self._lock:
+            totals, counts = dict(self.totals_ns), dict(self.counts)
+        staged_ns = sum(totals.get(stage, 0) for stage in STAGES)
+        stages = {}
+        for stage in (*STAGES, "total"):
+            if stage in totals:
+                stages[stage] = {
+                    'count': counts[stage],
+                    'total_ms': totals[stage] / 1e6,
+                    'mean_us': totals[stage] / counts[stage] / 1e3,
+                    'share': totals[stage] / staged_ns if stage != "total" and staged_ns else None,
+                }
+        return {'started': self.started, 'calls': counts.get("total", 0), 'stages': stages}
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def format_table(self):
+        lines = [f"{'Fase':<14}{'Chiamate':>10}{'Totale ms':>12}{'Media us':>10}{'Quota':>8}"]
+        for stage, row in self.report()['stages'].items():
+            share = f"{row['share']:.0%}" if row['share'] is not None else ""
+            lines.append(f"{stage:<14}{row['count']:>10}{row['total_ms']:>12.1f}{row['mean_us']:>10.2f}{share:>8}")
+        return "\n".join(lines)
@@ -0,0 +1,261 @@
+"""Sorgenti del listino: JSON o YAML in un unico schema, validazione e snapshot compilato.
+
+Lo schema di riferimento e' quello di `ebay_professional_fees_it.json`; `ebay_fees.yaml`
+usa nomi diversi e viene tradotto qui. Lo snapshot (pickle del listino gia' compilato da
+`fee_engine.load_fee_data`, accanto al file sorgente) evita di rifare parsing e
+compilazione a ogni nuovo processo; vale solo finche' l'hash del sorgente coincide.
+
+Per generare lo snapshot:
+    python fee_schedule.py ebay_professional_fees_it.json
+"""
+import json
+import os
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_VERSION = 2
+
+_YAML_CONSTANTS = {'fixed_fee_per_order': 'fixed_order_fee_eur',
+                   'regulatory_adjustment_rate': 'regulatory_compliance_fee_rate',
+                   'currency_conversion_rate': 'currency_conversion_fee_rate'}
+_YAML_DISCOUNTS = {'top_rated_discount': 'top_rated_seller_discount_rate',
+                   'high_snad_surcharge': 'high_INAD_surcharge_rate',
+                   'below_standard_surcharge': 'below_standard_surcharge_rate'}
+_YAML_INTL = {'eurozone_sweden': 'Eurozone_Sweden', 'europe_non_eurozone_sweden_uk': 'Europe_non_eurozone_Sweden_UK',
+              'united_kingdom': 'United_Kingdom', 'united_states_canada': 'United_States_Canada',
+              'rest_of_world': 'Rest_of_world'}
+_YAML_NON_STORE = {'fixed_price': 'buy_it_now', 'auction': 'auction'}
+_YAML_STORES = {'base': 'Base', 'premium': 'Premium', 'premium_plus': 'Premium_Plus'}
+_YAML_STORE_FIELDS = {'monthly_fee': 'monthly_fee', 'fixed_price_free': 'free_buy_it_now_listings',
+                      'fixed_price_extra': 'extra_listing_fee_buy_it_now', 'auction_free': 'free_auction_listings',
+                      'auction_extra': 'extra_listing_fee_auction'}
+_YAML_TIER_BOUNDS = {'up_to': 'up_to_eur', 'from': 'from_eur', 'to': 'to_eur', 'above': 'above_eur'}
+_YAML_RESERVE_PRICE = {'rate': 'percentage_rate', 'min': 'min_fee', 'max': 'max_fee'}
+_YAML_DEFAULT_GROUP = "Other_categories_including_clothing_beauty"  # = fee_engine.DEFAULT_FVF_GROUP
+
+
+# --- Parsing ---
+def _rename(section, names, where):
+    unknown = set(section) - set(names)
+    if unknown:
+        raise ValueError(f"{where}: chiavi sconosciute {', '.join(sorted(unknown))}")
+    return {names[key]: value for key, value in section.items()}
+
+
+def _pct(rate):
+    return f"{rate * 100:g}%"
+
+
+def _yaml_fvf_groups(categories):
+    # Nel YAML le tariffe sono per categoria: le categorie con la stessa tariffa formano un gruppo
+    groups = {}
+    for cat_id, spec in categories.items():
+        if cat_id == 'default':
+            continue
+        if spec.get('fee_type') == 'tier':
+            tiers = [{_YAML_TIER_BOUNDS[k] if k in _YAML_TIER_BOUNDS else k: v for k, v in tier.items()}
+                     for tier in spec['tiers']]
+            key = json.dumps(tiers, sort_keys=True)
+            thresholds = sorted({v for tier in tiers for k, v in tier.items() if k != 'rate'})
+            name = (f"Scaglioni {' / '.join(_pct(tier['rate']) for tier in tiers)}"
+                    f" (soglie {', '.join(f'{v:g}€' for v in thresholds)})")
+            group = {'group': name, 'tiers': tiers}
+        else:
+            key = spec['rate']
+            group = {'group': f"Variabile {_pct(spec['rate'])}", 'variable_rate': spec['rate']}
+        groups.setdefault(key, dict(group, category_ids=[]))['category_ids'].append(int(cat_id))
+    result = list(groups.values())
+    default = categories.get('default')
+    if default is not None:
+        result.append({'group': _YAML_DEFAULT_GROUP, 'variable_rate': default['rate'],
+                       'category_ids': [int(c) for c in default.get('applies_to', [])]})
+    return result
+
+
+def yaml_to_fee_data(doc):
+    """Traduce lo schema di `ebay_fees.yaml` in quello del listino JSON."""
+    src = doc['ebay_it_fees']
+    constants = _rename(src['constants'], _YAML_CONSTANTS, "constants")
+    ins = src['insertion_fees']
+    vehicles = {}
+    for key, item in src['vehicles'].items():
+        if key == 'reserve_price_option_fee':
+            vehicles['vehicle_reserve_price_fee'] = item
+        elif 'type' not in item:
+            raise ValueError(f"vehicles.{key}: manca 'type' (es. high_value_vehicles)")
+        else:
+            vehicles[item['type']] = {'insertion_fee': item.get('insertion_fee'),
+                                      'final_value_fee': item.get('final_value_fee'),
+                                      'category_ids': [int(c) for c in str(key).split('_')]}
+    upgrades = dict(src['listing_upgrades'])
+    upgrades['reserve_price'] = _rename(upgrades['reserve_price'], _YAML_RESERVE_PRICE, "listing_upgrades.reserve_price")
+    if 'photos_upto_24' in upgrades:
+        upgrades['photos_up_to_24'] = upgrades.pop('photos_upto_24')
+    return {
+        'generated_on': str(src['meta']['generated']),
+        'constants': constants,
+        'discounts_surcharges': _rename(src['discounts_surcharges'], _YAML_DISCOUNTS, "discounts_surcharges"),
+        'international_fee_rates': _rename(src['international_fee_rates'], _YAML_INTL, "international_fee_rates"),
+        'insertion_fees': {
+            'non_store': _rename(ins['non_store'], _YAML_NON_STORE, "insertion_fees.non_store"),
+            'store_subscriptions': {_YAML_STORES[name]: _rename(store, _YAML_STORE_FIELDS, f"insertion_fees.stores.{name}")
+                                    for name, store in ins['stores'].items()},
+        },
+        'listing_upgrades': upgrades,
+        'vehicles': vehicles,
+        'regulatory_fee': {'rate': constants.get('regulatory_compliance_fee_rate')},
+        'currency_conversion': {'rate': constants.get('currency_conversion_fee_rate')},
+        'final_value_fees': _yaml_fvf_groups(src['categories']),
+    }
+
+
+def parse_fee_source(raw, file_path):
+    """Byte del file sorgente -> dict nello schema JSON (YAML riconosciuto dall'estensione)."""
+    if file_path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("Per leggere listini YAML serve PyYAML (pip install pyyaml).") from None
+        try:
+            doc = yaml.safe_load(raw)
+        except yaml.YAMLError as exc:
+            raise ValueError(f"{file_path}: YAML non valido: {exc}") from None
+        try:
+            return yaml_to_fee_data(doc)
+        except (KeyError, TypeError, AttributeError) as exc:
+            raise ValueError(f"{file_path}: sezione YAML mancante o malformata: {exc!r}") from None
+    return json.loads(raw.decode('utf-8'))
+
+
+# --- Validation ---
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_fee_data(data, intl_keys=()):
+    """Controlla tipi e sezioni richieste; solleva ValueError con l'elenco dei problemi."""
+    problems = []
+
+    def number(value, where, lo=None, hi=None):
+        if not _is_number(value):
+            problems.append(f"{where}: atteso un numero, trovato {value!r}")
+        elif (lo is not None and value < lo) or (hi is not None and value > hi):
+            problems.append(f"{where}: {value} fuori intervallo [{lo}, {hi}]")
+
+    def section(*path):
+        node = data
+        for key in path:
+            node = node.get(key) if isinstance(node, dict) else None
+        if not isinstance(node, dict):
+            problems.append(f"{'.'.join(path)}: sezione mancante")
+            return {}
+        return node
+
+    for key in ('fixed_order_fee_eur', 'regulatory_compliance_fee_rate'):
+        number(section('constants').get(key), f"constants.{key}", 0)
+    for key in ('top_rated_seller_discount_rate', 'high_INAD_surcharge_rate', 'below_standard_surcharge_rate'):
+        number(section('discounts_surcharges').get(key), f"discounts_surcharges.{key}", -1, 1)
+    intl = section('international_fee_rates')
+    for key in sorted(set(intl) | set(intl_keys)):
+        number(intl.get(key), f"international_fee_rates.{key}", 0, 1)
+    for key in ('buy_it_now', 'auction'):
+        number(section('insertion_fees', 'non_store').get(key), f"insertion_fees.non_store.{key}", 0)
+    for name, store in section('insertion_fees', 'store_subscriptions').items():
+        where = f"insertion_fees.store_subscriptions.{name}"
+        for key in ('free_buy_it_now_listings', 'free_auction_listings'):
+            if store.get(key) != "unlimited":
+                number(store.get(key), f"{where}.{key}", 0)
+        for key in ('extra_listing_fee_buy_it_now', 'extra_listing_fee_auction'):
+            number(store.get(key), f"{where}.{key}", 0)
+    upgrades = section('listing_upgrades')
+    number(upgrades.get('subtitle'), "listing_upgrades.subtitle", 0)
+    for key in ('percentage_rate', 'min_fee', 'max_fee'):
+        number(section('listing_upgrades', 'reserve_price').get(key), f"listing_upgrades.reserve_price.{key}", 0)
+    for key, item in section('vehicles').items():
+        if isinstance(item, dict):
+            for field in ('insertion_fee', 'final_value_fee'):
+                if field in item:
+                    number(item[field], f"vehicles.{key}.{field}", 0)
+        else:
+            number(item, f"vehicles.{key}", 0)
+
+    groups = data.get('final_value_fees')
+    if not isinstance(groups, list) or not groups:
+        problems.append("final_value_fees: elenco gruppi mancante")
+        groups = []
+    for i, group in enumerate(groups):
+        where = f"final_value_fees[{i}] ({group.get('group', '?')})"
+        if not isinstance(group.get('category_ids'), list):
+            problems.append(f"{where}: category_ids mancante")
+        elif not all(isinstance(c, int) for c in group['category_ids']):
+            problems.append(f"{where}: category_ids devono essere interi")
+        if 'variable_rate' in group:
+            number(group['variable_rate'], f"{where}.variable_rate", 0, 1)
+        elif isinstance(group.get('tiers'), list) and group['tiers']:
+            for j, tier in enumerate(group['tiers']):
+                number(tier.get('rate'), f"{where}.tiers[{j}].rate", 0, 1)
+                bounds = [k for k in ('up_to_eur', 'from_eur', 'to_eur', 'above_eur') if k in tier]
+                if bounds not in (['up_to_eur'], ['from_eur', 'to_eur'], ['above_eur']):
+                    problems.append(f"{where}.tiers[{j}]: limiti non validi {bounds}")
+                for k in bounds:
+                    number(tier[k], f"{where}.tiers[{j}].{k}", 0)
+        else:
+            problems.append(f"{where}: serve 'variable_rate' o 'tiers'")
+
+    if problems:
+        raise ValueError("Listino non valido:\n  " + "\n  ".join(problems))
+    return data
+
+
+# --- Snapshot ---
+def snapshot_path(file_path):
+    return file_path + SNAPSHOT_SUFFIX
+
+
+def read_snapshot(path, source_sha256):
+    """Listino compilato dallo snapshot, o None se assente, illeggibile o di un'altra versione del sorgente.
+
+    Lo snapshot e' un pickle: va letto solo da percorsi fidati (quelli accanto al listino).
+    """
+    import pickle
+    try:
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+            if header != (SNAPSHOT_VERSION, source_sha256):
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def write_snapshot(path, data):
+    """Scrive lo snapshot in modo atomico (file temporaneo + rename)."""
+    import pickle
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((SNAPSHOT_VERSION, data['_fingerprint'][1]), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    import argparse
+    from fee_engine import DEFAULT_FEE_FILE, load_fee_data
+
+    parser = argparse.ArgumentParser(description="Valida un listino JSON/YAML e ne scrive lo snapshot compilato.")
+    parser.add_argument("source", nargs="?", default=DEFAULT_FEE_FILE)
+    parser.add_argument("--check", action="store_true", help="valida soltanto, senza scrivere")
+    args = parser.parse_args(argv)
+
+    try:
+        data = load_fee_data(args.source, use_snapshot=False)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    groups = len(data['final_value_fees'])
+    print(f"{args.source}: valido ({groups} gruppi CVF, {len(data['_category_map'])} categorie)")
+    if not args.check:
+        write_snapshot(snapshot_path(args.source), data)
+        print(f"Snapshot scritto in {snapshot_path(args.source)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Registro mensile delle tariffe d'inserzione e confronto tra i piani Negozio.
+
+Legge in streaming gli eventi di un periodo (inserzioni e vendite) e tiene solo
+contatori mensili per tipo di inserzione: la tariffa della n-esima inserzione del mese
+dipende da n e dalla quota gratuita del piano, quindi dagli stessi contatori si ricavano
+in un solo passaggio tariffe d'inserzione, canoni e utile netto di tutti i piani.
+Le inserzioni nelle categorie veicoli pagano la tariffa veicoli e non consumano quote.
+
+Esempio (CSV con colonne event=listing|sale, date=AAAA-MM-GG e i parametri di calculate_fees):
+    python insertion_ledger.py eventi_2025.csv
+"""
+import csv
+import sys
+from collections import namedtuple
+from decimal import Decimal
+
+from fee_engine import calculate_fees, get_fee_data, to_decimal, to_percentage_decimal
+from order_params import PARAMS, parse_bool
+
+NO_STORE = "Nessuno"
+LISTING_KEYS = ("buy_it_now", "auction")
+_ZERO = Decimal('0')
+
+PlanSummary = namedtuple("PlanSummary", [
+    "plan", "months", "listings", "insertion_fees", "subscription_fees", "upgrade_fees", "sale_fees",
+    "total_fees_pre_vat", "vat_amount", "total_fees_incl_vat", "net_profit", "profit_if_vat_reclaimed"])
+
+
+class _Month:
+    __slots__ = ("listings", "vehicle_insertion", "upgrades", "sale_fees", "revenue")
+
+    def __init__(self):
+        self.listings = dict.fromkeys(LISTING_KEYS, 0)
+        self.vehicle_insertion = self.upgrades = self.sale_fees = self.revenue = _ZERO
+
+
+def _listing_key(listing_type):
+    return "auction" if listing_type == "Asta" else "buy_it_now"
+
+
+def _month_of(date):
+    # "2025-03-14", date/datetime o gia' "2025-03"
+    return str(date)[:7]
+
+
+class InsertionLedger:
+    def __init__(self, fee_data=None, apply_vat=True, vat_rate_input=22.0):
+        self.fee_data = fee_data if fee_data is not None else get_fee_data()
+        self.apply_vat, self.vat_rate_input = apply_vat, vat_rate_input
+        ins = self.fee_data['insertion_fees']
+        self.plans = [NO_STORE] + list(ins['store_subscriptions'])
+        # regole[piano][tipo] = (quota gratuita: int, None = illimitata; tariffa oltre quota)
+        self._rules = {NO_STORE: {key: (0, to_decimal(ins['non_store'][key])) for key in LISTING_KEYS}}
+        self._monthly_fee = {NO_STORE: to_decimal(0)}
+        for name, store in ins['store_subscriptions'].items():
+            rules = {}
+            for key in LISTING_KEYS:
+                allowance = store.get(f"free_{key}_listings")
+                extra = to_decimal(store.get(f"extra_listing_fee_{key}", '0'))
+                if allowance == "unlimited":
+                    rules[key] = (None, _ZERO)
+                else:
+                    rules[key] = (allowance if isinstance(allowance, int) else 0, extra)
+            self._rules[name] = rules
+            self._monthly_fee[name] = to_decimal(store.get('monthly_fee', 0))
+        self.months = {}
+
+    def _month(self, date):
+        month = _month_of(date)
+        totals = self.months.get(month)
+        if totals is None:
+            totals = self.months[month] = _Month()
+        return totals
+
+    def add_listing(self, date, listing_type, category_id, add_subtitle=False, reserve_price_value=0.0,
+                    use_reserve_price=False):
+        totals = self._month(date)
+        vehicle = self.fee_data['_vehicle_category_map'].get(category_id)
+        if vehicle is not None and 'insertion_fee' in vehicle:
+            totals.vehicle_insertion += vehicle['insertion_fee']
+        else:
+            totals.listings[_listing_key(listing_type)] += 1
+        # Opzioni come in calculate_fees: non dipendono dal piano
+        if add_subtitle:
+            totals.upgrades += to_decimal(self.fee_data['listing_upgrades']['subtitle'])
+        if use_reserve_price and reserve_price_value > 0 and listing_type == "Asta":
+            if vehicle is not None and "vehicle_reserve_price_fee" in self.fee_data['vehicles']:
+                totals.upgrades += to_decimal(self.fee_data['vehicles']['vehicle_reserve_price_fee'])
+            else:
+                rp_cfg = self.fee_data['listing_upgrades']['reserve_price']
+                totals.upgrades += max(to_decimal(rp_cfg['min_fee']), min(to_decimal(rp_cfg['max_fee']),
+                                       to_decimal(reserve_price_value) * to_percentage_decimal(rp_cfg['percentage_rate'])))
+
+    def add_sale(self, date, item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                 category_id, buyer_country, seller_status, high_inad_surcharge, listing_type="Compralo Subito"):
+        # Commissioni sul venduto senza inserzione e opzioni (gia' contate in add_listing) e senza IVA
+        fees = calculate_fees(item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                              category_id, buyer_country, seller_status, high_inad_surcharge,
+                              NO_STORE, 1, listing_type, False, 0.0, False, False, 0.0, fee_data=self.fee_data)
+        totals = self._month(date)
+        totals.sale_fees += fees['total_fees_pre_vat'] - fees['insertion_fee']
+        totals.revenue += fees['total_sale_price'] - fees['item_cost'] - fees['your_actual_shipping_cost']
+
+    def add(self, event):
+        """Evento come dict: {'event': 'listing'|'sale', 'date': ..., <argomenti di add_listing/add_sale>}."""
+        kwargs = dict(event)
+        kind = kwargs.pop('event')
+        if kind == "listing":
+            self.add_listing(**{k: v for k, v in kwargs.items() if k in _LISTING_ARGS})
+        elif kind == "sale":
+            self.add_sale(**{k: v for k, v in kwargs.items() if k in _SALE_ARGS})
+        else:
+            raise ValueError(f"Evento sconosciuto {kind!r}, attesi: listing, sale")
+
+    def insertion_fees(self, plan, month):
+        """Tariffe d'inserzione del mese (AAAA-MM) con il piano indicato."""
+        return self._month_insertion(self._rules[plan], self.months[month])
+
+    @staticmethod
+    def _month_insertion(rules, totals):
+        fee = totals.vehicle_insertion
+        for key, count in totals.listings.items():
+            allowance, extra = rules[key]
+            if allowance is not None and count > allowance:
+                fee += extra * (count - allowance)
+        return fee
+
+    def summary(self):
+        """Un PlanSummary per piano, dal piu' conveniente (utile netto piu' alto)."""
+        vat_rate = to_percentage_decimal(self.vat_rate_input / 100) if self.apply_vat else None
+        summaries = []
+        for plan in self.plans:
+            rules, monthly_fee = self._rules[plan], self._monthly_fee[plan]
+            insertion = subscription = upgrades = sale_fees = revenue = vat = _ZERO
+            listings = 0
+            for totals in self.months.values():
+                month_insertion = self._month_insertion(rules, totals)
+                listings += sum(totals.listings.values())
+                month_total = month_insertion + monthly_fee + totals.upgrades + totals.sale_fees
+                if vat_rate is not None:
+                    vat += to_decimal(month_total * vat_rate)  # IVA sul totale mensile, come in fattura
+                insertion += month_insertion; subscription += monthly_fee
+                upgrades += totals.upgrades; sale_fees += totals.sale_fees; revenue += totals.revenue
+            pre_vat = to_decimal(insertion + subscription + upgrades + sale_fees)
+            summaries.append(PlanSummary(plan, len(self.months), listings, to_decimal(insertion), subscription,
+                                         to_decimal(upgrades), to_decimal(sale_fees), pre_vat, vat, pre_vat + vat,
+                                         revenue - pre_vat - vat, revenue - pre_vat))
+        return sorted(summaries, key=lambda s: s.net_profit, reverse=True)
+
+
+_LISTING_ARGS = ("date", "listing_type", "category_id", "add_subtitle", "reserve_price_value", "use_reserve_price")
+_SALE_ARGS = ("date", "item_price", "shipping_charged_to_customer", "item_cost", "your_actual_shipping_cost",
+              "category_id", "buyer_country", "seller_status", "high_inad_surcharge", "listing_type")
+
+
+def replay_check(events, fee_data=None):
+    """Confronta il registro con calculate_fees rieseguito inserzione per inserzione, piano per piano.
+
+    Restituisce {piano: (tariffe inserzione + opzioni dal registro, dalla riesecuzione)}.
+    """
+    if fee_data is None: fee_data = get_fee_data()
+    events = list(events)
+    ledger = InsertionLedger(fee_data, apply_vat=False)
+    for event in events:
+        ledger.add(event)
+    result = {}
+    for plan in ledger.plans:
+        counters, replayed = {}, _ZERO
+        for event in events:
+            if event['event'] != "listing":
+                continue
+            key = (_month_of(event['date']), _listing_key(event['listing_type']))
+            if event['category_id'] not in fee_data['_vehicle_category_map']:
+                counters[key] = counters.get(key, 0) + 1
+            fees = calculate_fees(0.0, 0.0, 0.0, 0.0, event['category_id'], "Italia", "Standard", False,
+                                  plan, counters.get(key, 1), event['listing_type'], event.get('add_subtitle', False),
+                                  event.get('reserve_price_value', 0.0), event.get('use_reserve_price', False),
+                                  False, 0.0, fee_data=fee_data)
+            replayed += fees['insertion_fee'] + fees['listing_upgrade_total_fee']
+        s = next(s for s in ledger.summary() if s.plan == plan)
+        result[plan] = (s.insertion_fees + s.upgrade_fees, to_decimal(replayed))
+    return result
+
+
+def random_events(n=20_000, seed=0, fee_data=None):
+    import random
+
+    if fee_data is None: fee_data = get_fee_data()
+    rnd = random.Random(seed)
+    categories = list(fee_data['_category_map']) + list(fee_data['_vehicle_category_map'])
+    for _ in range(n):
+        # volumi mensili variabili, per attraversare le quote gratuite di tutti i piani
+        date = f"2025-{rnd.randint(1, 12):02d}-01"
+        if rnd.random() < 0.7:
+            yield {'event': "listing", 'date': date, 'listing_type': rnd.choice(["Asta", "Compralo Subito"]),
+                   'category_id': rnd.choice(categories), 'add_subtitle': rnd.random() < 0.2,
+                   'reserve_price_value': round(rnd.uniform(0, 6000), 2), 'use_reserve_price': rnd.random() < 0.2}
+        else:
+            yield {'event': "sale", 'date': date, 'item_price': round(rnd.uniform(1, 3000), 2),
+                   'shipping_charged_to_customer': 5.0, 'item_cost': 10.0, 'your_actual_shipping_cost': 4.0,
+                   'category_id': rnd.choice(categories), 'buyer_country': "Italia", 'seller_status': "Standard",
+                   'high_inad_surcharge': False}
+
+
+def iter_csv_events(path, delimiter=','):
+    handle = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8-sig', newline='')
+    try:
+        for row in csv.DictReader(handle, delimiter=delimiter):
+            event = {'event': row.pop('event').strip().lower(), 'date': row.pop('date')}
+            for key, text in row.items():
+                if key not in PARAMS or text is None or text == "":
+                    continue
+                kind = PARAMS[key][0]
+                event[key] = parse_bool(text) if kind is bool else kind(text)
+            yield event
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Confronta i piani Negozio eBay su uno storico di inserzioni e vendite.")
+    parser.add_argument("events", nargs="?", help="CSV con colonne event (listing/sale), date e parametri di calculate_fees")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--vat-rate", type=float, default=22.0)
+    parser.add_argument("--no-vat", action="store_true")
+    parser.add_argument("--check", action="store_true", help="verifica il registro contro calculate_fees su eventi casuali")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        bad = {plan: pair for plan, pair in replay_check(random_events()).items() if pair[0] != pair[1]}
+        print(f"Piani con discrepanze registro/calculate_fees: {len(bad)} {bad or ''}")
+        raise SystemExit(1 if bad else 0)
+    if args.events is None:
+        parser.error("serve il file eventi (oppure --check)")
+
+    ledger = InsertionLedger(apply_vat=not args.no_vat, vat_rate_input=args.vat_rate)
+    for event in iter_csv_events(args.events, args.delimiter):
+        ledger.add(event)
+    print(f"{'Piano':<14}{'Inserzioni':>12}{'Canoni':>10}{'Commissioni':>14}{'IVA':>10}{'Utile netto':>14}")
+    for s in ledger.summary():
+        print(f"{s.plan:<14}{s.insertion_fees:>12}{s.subscription_fees:>10}{s.total_fees_pre_vat:>14}"
+              f"{s.vat_amount:>10}{s.net_profit:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Schema dei parametri d'ordine condiviso dagli strumenti (riconciliazione, registro, server).
+
+Solo libreria standard: importarlo non carica NumPy ne' il motore batch.
+"""
+
+# parametro di calculate_fees -> (tipo, valore di default; None = obbligatorio)
+PARAMS = {
+    'item_price': (float, None),
+    'shipping_charged_to_customer': (float, 0.0),
+    'item_cost': (float, 0.0),
+    'your_actual_shipping_cost': (float, 0.0),
+    'category_id': (int, None),
+    'buyer_country': (str, "Italia"),
+    'seller_status': (str, "Standard"),
+    'high_inad_surcharge': (bool, False),
+    'store_subscription': (str, "Nessuno"),
+    'num_listings_this_month': (int, 1),
+    'listing_type': (str, "Compralo Subito"),
+    'add_subtitle': (bool, False),
+    'reserve_price_value': (float, 0.0),
+    'use_reserve_price': (bool, False),
+    'apply_vat': (bool, True),
+    'vat_rate_input': (float, 22.0),
+}
+
+TRUE_VALUES = frozenset({"1", "true", "vero", "si", "sì", "yes", "y", "x"})
+
+
+def parse_bool(value):
+    """Booleano da testo di CSV/JSON ("Vero", "si", "1", ...); i bool passano invariati."""
+    return value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
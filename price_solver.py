@@ -0,0 +1,232 @@
+"""Prezzo minimo per pareggio, utile obiettivo o margine obiettivo.
+
+Le commissioni sono lineari a tratti nel totale vendita T = prezzo + spedizione
+pagata (CVF a scaglioni, adeguamento normativo, tariffa internazionale, IVA sulle
+commissioni); la condizione
+
+    utile_netto(T) >= target_profit + target_margin * T
+
+si risolve quindi in forma chiusa tratto per tratto. La soluzione analitica viene
+poi portata al centesimo con `calculate_fees` (o `calculate_fees_batch`), che
+tiene conto degli arrotondamenti per singola voce: bastano una o due verifiche.
+"""
+from decimal import Decimal, ROUND_CEILING
+
+import numpy as np
+
+from batch_engine import (BELOW_STANDARD, RATE_SCALE, TOP_RATED, _PAD_BREAKPOINT, _lookup, calculate_fees_batch,
+                          load_fee_tables, random_orders, resolve_categories)
+from fee_engine import (COUNTRY_MAP, VEHICLE_FIXED_FVF_TYPES, calculate_fees, get_fee_data, resolve_fvf_group,
+                        to_decimal, to_percentage_decimal)
+
+MIN_ITEM_PRICE = Decimal('0.01')
+MAX_ADJUST_STEPS = 50  # gli arrotondamenti spostano la soluzione di pochi centesimi
+UNREACHABLE = -1
+
+
+# --- Scalar solver ---
+def _fvf_segments(category_id, fee_data):
+    # Tratti (inizio, fine, aliquota, CVF all'inizio) della CVF base in funzione di T
+    vehicle_info = fee_data['_vehicle_category_map'].get(category_id)
+    if vehicle_info and vehicle_info['type'] in VEHICLE_FIXED_FVF_TYPES:
+        return [(Decimal('0'), None, Decimal('0'), vehicle_info['final_value_fee'])], True
+    group = resolve_fvf_group(category_id, fee_data)
+    if group and 'variable_rate' in group:
+        return [(Decimal('0'), None, to_percentage_decimal(group['variable_rate']), Decimal('0'))], False
+    if group and 'tiers' in group:
+        schedule = group['_schedule']
+        ends = list(schedule.breakpoints[1:]) + [None]
+        return list(zip(schedule.breakpoints, ends, schedule.rates, schedule.cumulative)), False
+    return [(Decimal('0'), None, Decimal('0'), Decimal('0'))], False
+
+
+def _meets_target(results, target_profit, target_margin):
+    return results['net_profit'] >= target_profit + target_margin * results['total_sale_price']
+
+
+def solve_price(item_cost, your_actual_shipping_cost, category_id, buyer_country, seller_status="Standard",
+                store_subscription="Nessuno", shipping_charged_to_customer=0, target_profit=0, target_margin=0,
+                high_inad_surcharge=False, num_listings_this_month=1, listing_type="Compralo Subito",
+                add_subtitle=False, reserve_price_value=0, use_reserve_price=False,
+                apply_vat=True, vat_rate_input=22.0, fee_data=None):
+    """Prezzo oggetto minimo (Decimal, al centesimo) che raggiunge l'obiettivo; None se irraggiungibile.
+
+    `target_margin` e' la quota di utile netto sul totale vendita (0.15 = 15%).
+    """
+    if fee_data is None: fee_data = get_fee_data()
+    target_profit = Decimal(str(target_profit)); target_margin = Decimal(str(target_margin))
+    shipping_dec = to_decimal(shipping_charged_to_customer)
+    costs = to_decimal(item_cost) + to_decimal(your_actual_shipping_cost)
+
+    def fees_at(price):
+        return calculate_fees(price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                              category_id, buyer_country, seller_status, high_inad_surcharge,
+                              store_subscription, num_listings_this_month, listing_type,
+                              add_subtitle, reserve_price_value, use_reserve_price,
+                              apply_vat, vat_rate_input, fee_data=fee_data)
+
+    # Voci indipendenti dal prezzo (ordine, inserzione, opzioni): una sola valutazione
+    probe = fees_at(MIN_ITEM_PRICE)
+    constant_fees = probe['fixed_order_fee'] + probe['insertion_fee'] + probe['listing_upgrade_total_fee']
+
+    segments, is_vehicle_fixed = _fvf_segments(category_id, fee_data)
+    ds = fee_data['discounts_surcharges']
+    fvf_mult = Decimal('1')
+    if not is_vehicle_fixed:
+        if seller_status == TOP_RATED: fvf_mult -= abs(to_percentage_decimal(ds['top_rated_seller_discount_rate']))
+        if high_inad_surcharge: fvf_mult += to_percentage_decimal(ds['high_INAD_surcharge_rate'])
+        if seller_status == BELOW_STANDARD: fvf_mult += to_percentage_decimal(ds['below_standard_surcharge_rate'])
+    linear_rate = (to_percentage_decimal(fee_data['constants']['regulatory_compliance_fee_rate'])
+                   + to_percentage_decimal(fee_data['international_fee_rates'][COUNTRY_MAP.get(buyer_country, "Rest_of_world")]))
+    vat_mult = 1 + (to_percentage_decimal(vat_rate_input / 100) if apply_vat else Decimal('0'))
+
+    # g(T) = T - costi - (1+IVA)*commissioni(T) - obiettivo: lineare in ogni tratto
+    total_min = shipping_dec + MIN_ITEM_PRICE
+    solution = None
+    for start, end, rate, fee_at_start in segments:
+        slope = 1 - target_margin - vat_mult * (fvf_mult * rate + linear_rate)
+        intercept = -costs - target_profit - vat_mult * (fvf_mult * (fee_at_start - start * rate) + constant_fees)
+        low = max(start, total_min)
+        if end is not None and end < low:
+            continue
+        if slope * low + intercept >= 0:
+            solution = low; break
+        if slope > 0 and (end is None or -intercept / slope <= end):
+            solution = -intercept / slope; break
+    if solution is None:
+        return None
+
+    price = max(MIN_ITEM_PRICE, (solution - shipping_dec).quantize(Decimal('0.01'), rounding=ROUND_CEILING))
+    for _ in range(MAX_ADJUST_STEPS):
+        if _meets_target(fees_at(price), target_profit, target_margin): break
+        price += Decimal('0.01')
+    else:
+        return None
+    while price > MIN_ITEM_PRICE and _meets_target(fees_at(price - Decimal('0.01')), target_profit, target_margin):
+        price -= Decimal('0.01')
+    return price
+
+
+# --- Batch solver ---
+def _batch_meets(results, target_profit_c, target_margin):
+    return results['net_profit'] - target_profit_c - target_margin * results['total_sale_price'] >= -1e-9
+
+
+def solve_price_batch(tables, item_cost, your_actual_shipping_cost, category_id, buyer_country,
+                      seller_status="Standard", store_subscription="Nessuno", shipping_charged_to_customer=0.0,
+                      target_profit=0.0, target_margin=0.0, **options):
+    """Versione colonnare di `solve_price`: prezzi in centesimi (int64), `UNREACHABLE` se irraggiungibile.
+
+    `options` accetta gli altri argomenti di `calculate_fees_batch` (negozio, opzioni, IVA, ...).
+    """
+    base = dict(item_cost=item_cost, your_actual_shipping_cost=your_actual_shipping_cost, category_id=category_id,
+                buyer_country=buyer_country, seller_status=seller_status, store_subscription=store_subscription,
+                shipping_charged_to_customer=shipping_charged_to_customer, **options)
+    min_price = float(MIN_ITEM_PRICE)
+    probe = calculate_fees_batch(tables, item_price=min_price, **base)
+    n = probe['net_profit'].shape or (1,)
+    shape = n + (1,)
+    probe = {key: np.broadcast_to(value, n) for key, value in probe.items()}
+
+    constant_fees = (probe['fixed_order_fee'] + probe['insertion_fee'] + probe['listing_upgrade_total_fee']) / 100
+    costs = (probe['item_cost'] + probe['your_actual_shipping_cost']) / 100
+    shipping = probe['total_sale_price'] / 100 - min_price
+    target_margin = np.broadcast_to(np.asarray(target_margin, dtype=np.float64), n)
+    target_profit = np.broadcast_to(np.asarray(target_profit, dtype=np.float64), n)
+
+    group, vehicle = resolve_categories(tables, category_id)
+    group = np.broadcast_to(group, n); vehicle = np.broadcast_to(vehicle, n)
+    is_vehicle_fixed = tables['vehicle_fixed_fvf'][vehicle]
+    bp = tables['breakpoints'][group]
+    valid = bp < _PAD_BREAKPOINT
+    start = np.where(valid, bp, 0) / 100
+    end = np.concatenate([start[:, 1:], np.full(shape, np.inf)], axis=1)
+    end = np.where(np.concatenate([valid[:, 1:], np.zeros(shape, dtype=bool)], axis=1), end, np.inf)
+    rate = tables['rates'][group] / RATE_SCALE
+    fee_at_start = tables['cumulative'][group] / RATE_SCALE / 100
+    # veicoli: un unico tratto piatto pari alla tariffa fissa
+    fixed = is_vehicle_fixed[:, None]
+    first = np.arange(bp.shape[1]) == 0
+    valid = np.where(fixed, first, valid)
+    rate = np.where(fixed, 0.0, rate)
+    fee_at_start = np.where(fixed, (tables['vehicle_fvf'][vehicle] / 100)[:, None], fee_at_start)
+    end = np.where(fixed & first, np.inf, end)
+
+    status = np.broadcast_to(np.asarray(seller_status), n)
+    adjustment = (np.where(status == TOP_RATED, -tables['top_rated_discount'], 0)
+                  + np.where(np.broadcast_to(np.asarray(options.get('high_inad_surcharge', False), dtype=bool), n),
+                             tables['high_inad_surcharge'], 0)
+                  + np.where(status == BELOW_STANDARD, tables['below_standard_surcharge'], 0))
+    fvf_mult = np.where(is_vehicle_fixed, 1.0, 1 + adjustment / RATE_SCALE)[:, None]
+    intl = np.broadcast_to(_lookup(buyer_country, tables['intl_rate_by_country'], tables['intl_rate_default']), n)
+    linear_rate = ((tables['regulatory_rate'] + intl) / RATE_SCALE)[:, None]
+    apply_vat = np.broadcast_to(np.asarray(options.get('apply_vat', True), dtype=bool), n)
+    vat_mult = (1 + np.where(apply_vat, np.asarray(options.get('vat_rate_input', 22.0), dtype=np.float64) / 100, 0))[:, None]
+
+    slope = 1 - target_margin[:, None] - vat_mult * (fvf_mult * rate + linear_rate)
+    intercept = (-(costs + target_profit)[:, None]
+                 - vat_mult * (fvf_mult * (fee_at_start - start * rate) + constant_fees[:, None]))
+    low = np.maximum(start, (shipping + min_price)[:, None])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.where(slope > 0, -intercept / slope, np.inf)
+    candidate = np.where(slope * low + intercept >= 0, low, np.maximum(root, low))
+    candidate = np.where(valid & (end >= low) & (candidate <= end), candidate, np.inf)
+    total = candidate.min(axis=1)
+
+    reachable = np.isfinite(total)
+    price = np.where(reachable, np.ceil(np.round((np.where(reachable, total, 0) - shipping) * 100, 6)), 1).astype(np.int64)
+    price = np.maximum(price, 1)
+    target_profit_c = target_profit * 100
+
+    def row_args(rows):
+        return {key: (np.broadcast_to(np.asarray(value), n)[rows] if np.ndim(value) else value)
+                for key, value in base.items()}
+
+    def meets(rows, cents):
+        results = calculate_fees_batch(tables, item_price=cents / 100, **row_args(rows))
+        return _batch_meets(results, target_profit_c[rows], target_margin[rows])
+
+    pending = np.flatnonzero(reachable)
+    for _ in range(MAX_ADJUST_STEPS):
+        if pending.size == 0: break
+        ok = meets(pending, price[pending])
+        pending = pending[~ok]
+        price[pending] += 1
+    reachable[pending] = False
+    pending = np.flatnonzero(reachable & (price > 1))
+    while pending.size:
+        ok = meets(pending, price[pending] - 1)
+        pending = pending[ok]
+        price[pending] -= 1
+        pending = pending[price[pending] > 1]
+    return np.where(reachable, price, UNREACHABLE)
+
+
+# --- Cross-check ---
+def cross_check(n=300, seed=0, fee_file=None):
+    """Risolve in batch ordini sintetici e verifica con `calculate_fees` e `solve_price`; restituisce le discrepanze."""
+    tables = load_fee_tables(fee_file) if fee_file else load_fee_tables()
+    fee_data = get_fee_data(fee_file) if fee_file else get_fee_data()
+    orders = random_orders(tables, n, seed)
+    orders.pop('item_price')
+    rng = np.random.default_rng(seed + 1)
+    targets = {'target_profit': rng.choice([0.0, 5.0, 25.0], n), 'target_margin': rng.choice([0.0, 0.1, 0.25], n)}
+    prices = solve_price_batch(tables, **orders, **targets)
+    mismatches = []
+    for i in range(n):
+        row = {key: values[i].item() for key, values in orders.items()}
+        goal = {key: values[i].item() for key, values in targets.items()}
+        expected = solve_price(**row, **goal, fee_data=fee_data)
+        got = None if prices[i] == UNREACHABLE else Decimal(int(prices[i])).scaleb(-2)
+        if expected != got:
+            mismatches.append({'row': row, 'target': goal, 'scalar': expected, 'batch': got})
+    return mismatches
+
+
+if __name__ == "__main__":
+    import warnings
+    warnings.simplefilter("ignore")  # categorie sconosciute volute nel campione
+    found = cross_check()
+    print(f"Discrepanze solver batch/scalare: {len(found)}")
+    for mismatch in found[:20]:
+        print(mismatch)
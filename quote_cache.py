@@ -0,0 +1,93 @@
+"""Cache LRU limitata per i preventivi di `calculate_fees`.
+
+Le combinazioni di input si ripetono molto (stessi prezzi SKU, paesi, categorie):
+la chiave e' la tupla normalizzata degli input (importi al centesimo come li
+arrotonda il motore). La cache si svuota da sola quando cambia il listino
+(`generated_on` o hash del file) ed e' utilizzabile da piu' thread.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from fee_engine import calculate_fees, get_fee_data
+from fee_engine_cents import to_cents
+
+DEFAULT_MAXSIZE = 4096
+
+
+class QuoteCacheInfo(namedtuple("QuoteCacheInfo", ["hits", "misses", "evictions", "invalidations", "maxsize", "currsize"])):
+    __slots__ = ()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _copy_results(results):
+    # I Decimal sono immutabili: bastano copie delle liste di dettaglio
+    copied = dict(results)
+    copied['fvf_discounts_surcharges'] = list(results['fvf_discounts_surcharges'])
+    copied['listing_upgrades_fees'] = list(results['listing_upgrades_fees'])
+    return copied
+
+
+class QuoteCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        if maxsize < 1:
+            raise ValueError("maxsize deve essere almeno 1")
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._hits = self._misses = self._evictions = self._invalidations = 0
+
+    def calculate_fees(self, item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                       category_id, buyer_country, seller_status, high_inad_surcharge,
+                       store_subscription, num_listings_this_month, listing_type,
+                       add_subtitle, reserve_price_value, use_reserve_price,
+                       apply_vat, vat_rate_input, fee_data=None):
+        """Come `fee_engine.calculate_fees`, con memoizzazione. Non modificare i dict annidati restituiti."""
+        if fee_data is None: fee_data = get_fee_data()
+        fingerprint = fee_data.get('_fingerprint', id(fee_data))
+        key = (to_cents(item_price), to_cents(shipping_charged_to_customer), to_cents(item_cost),
+               to_cents(your_actual_shipping_cost), category_id, buyer_country, seller_status,
+               bool(high_inad_surcharge), store_subscription, num_listings_this_month, listing_type,
+               bool(add_subtitle), to_cents(reserve_price_value), reserve_price_value > 0, bool(use_reserve_price),
+               bool(apply_vat), float(vat_rate_input))
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                if self._entries:
+                    self._invalidations += 1
+                    self._entries.clear()
+                self._fingerprint = fingerprint
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return _copy_results(results)
+            self._misses += 1
+
+        # calcolo fuori dal lock: thread diversi non si bloccano a vicenda
+        results = calculate_fees(item_price, shipping_charged_to_customer, item_cost, your_actual_shipping_cost,
+                                 category_id, buyer_country, seller_status, high_inad_surcharge,
+                                 store_subscription, num_listings_this_month, listing_type,
+                                 add_subtitle, reserve_price_value, use_reserve_price,
+                                 apply_vat, vat_rate_input, fee_data=fee_data)
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                self._entries[key] = results
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return _copy_results(results)
+
+    def cache_info(self):
+        with self._lock:
+            return QuoteCacheInfo(self._hits, self._misses, self._evictions, self._invalidations,
+                                  self.maxsize, len(self._entries))
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = self._invalidations = 0
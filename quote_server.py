@@ -0,0 +1,288 @@
+"""Servizio HTTP locale di preventivi commissioni (solo libreria standard, asyncio).
+
+Endpoint (JSON):
+    POST /quote    un ordine  -> il dict di `calculate_fees` (stessi campi mostrati nell'app)
+    POST /quotes   {"orders": [...]} o una lista -> {"quotes": [...]}, errori per singolo ordine
+    GET  /health   stato, richieste in coda, statistiche della cache preventivi
+
+I parametri hanno gli stessi nomi e default di reconcile.py (order_params.PARAMS).
+Le richieste singole concorrenti vengono raccolte in micro-batch e calcolate fuori dal
+loop (thread o, con --workers N, processi) insieme alla serializzazione; oltre
+--max-pending ordini in attesa il server risponde 503 invece di accodare all'infinito.
+
+Esempio:
+    python quote_server.py --port 8765 --workers 4
+    curl -d '{"item_price": 120, "category_id": 9355, "buyer_country": "Germania"}' localhost:8765/quote
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+
+from fee_engine import VEHICLE_FIXED_FVF_TYPES, get_fee_data, set_reload_interval, to_decimal
+from order_params import PARAMS, parse_bool
+from quote_cache import QuoteCache
+
+DEFAULT_PORT = 8765
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_WINDOW = 0.002  # secondi di attesa per riempire un micro-batch
+DEFAULT_MAX_PENDING = 10_000
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+# --- Computation (nel thread/processo di calcolo) ---
+_cache = QuoteCache()
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} non serializzabile")
+
+
+def parse_order(order):
+    """Ordine JSON -> argomenti posizionali di calculate_fees (ValueError se non valido)."""
+    if not isinstance(order, dict):
+        raise ValueError("ogni ordine deve essere un oggetto JSON")
+    unknown = set(order) - set(PARAMS)
+    if unknown:
+        raise ValueError(f"parametri sconosciuti: {', '.join(sorted(unknown))}")
+    args = []
+    for param, (kind, default) in PARAMS.items():
+        value = order.get(param, default)
+        if value is None:
+            raise ValueError(f"parametro obbligatorio mancante: {param}")
+        try:
+            if kind is bool:
+                value = parse_bool(value)
+            elif kind is str:
+                value = str(value)
+            else:
+                if isinstance(value, bool):
+                    raise ValueError
+                value = kind(value)
+                if kind is float and not math.isfinite(value):  # NaN/inf finirebbero nel JSON di risposta
+                    raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"{param}: valore non valido {value!r}") from None
+        args.append(value)
+    return args
+
+
+def _out_of_range(args):
+    for (param, (kind, _)), value in zip(PARAMS.items(), args):
+        if kind is float:
+            try:
+                to_decimal(value)
+            except ArithmeticError:
+                return f"{param}: valore fuori intervallo {value!r}"
+    return "importi fuori intervallo"
+
+
+def quote_one(order, fee_data):
+    try:
+        args = parse_order(order)
+        results = _cache.calculate_fees(*args, fee_data=fee_data)
+    except ValueError as exc:
+        return 400, {"error": str(exc)}
+    except KeyError as exc:  # es. negozio inesistente nel listino
+        return 400, {"error": f"ordine non calcolabile: valore sconosciuto {exc}"}
+    except ArithmeticError:  # importo oltre la precisione Decimal, es. 1e300
+        return 400, {"error": f"ordine non calcolabile: {_out_of_range(args)}"}
+    # Stesso avviso che l'app mostra per le categorie sconosciute (la cache non lo ripete)
+    category_id = args[4]
+    vehicle = fee_data['_vehicle_category_map'].get(category_id)
+    if category_id not in fee_data['_category_map'] and not (vehicle and vehicle['type'] in VEHICLE_FIXED_FVF_TYPES):
+        results['warnings'] = [f"ID Cat. {category_id} non trovato, default 'Altre cat.'"]
+    return 200, results
+
+
+def _dumps(payload):
+    return json.dumps(payload, default=_json_default).encode()
+
+
+def quote_many(orders):
+    """Micro-batch di ordini -> [(stato HTTP, corpo JSON in byte)]; un solo listino per tutto il batch."""
+    fee_data = get_fee_data()
+    out = []
+    with warnings.catch_warnings():
+        # l'avviso sulle categorie sconosciute arriva al client nel campo 'warnings'
+        warnings.filterwarnings("ignore", message="ID Cat. ")
+        for order in orders:
+            status, payload = quote_one(order, fee_data)
+            out.append((status, _dumps(payload)))
+    return out
+
+
+def quote_bulk(orders):
+    fee_data = get_fee_data()
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="ID Cat. ")
+        return [_dumps(quote_one(order, fee_data)[1]) for order in orders]
+
+
+def _init_worker(reload_interval):
+    set_reload_interval(reload_interval)
+    get_fee_data()
+
+
+# --- Server ---
+class QuoteServer:
+    def __init__(self, workers=1, batch_size=DEFAULT_BATCH_SIZE, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_pending=DEFAULT_MAX_PENDING, reload_interval=0):
+        self.workers, self.batch_size, self.batch_window = workers, batch_size, batch_window
+        self.max_pending = max_pending
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                 initargs=(reload_interval,))
+        else:
+            _init_worker(reload_interval)
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._queue = None
+        self._bulk_pending = 0
+        self._batchers = []
+
+    @property
+    def pending(self):
+        return (self._queue.qsize() if self._queue else 0) + self._bulk_pending
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            for attempt in range(2):
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                if attempt or len(batch) >= self.batch_size or not self.batch_window:
+                    break
+                await asyncio.sleep(self.batch_window)
+            try:
+                responses = await loop.run_in_executor(self._executor, quote_many, [order for order, _ in batch])
+            except Exception as exc:  # worker morto o simili: fallisce il batch, non il server
+                responses = [(503, _dumps({"error": f"calcolo non riuscito: {exc}"}))] * len(batch)
+            for (_, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+
+    async def _quote(self, body):
+        try:
+            order = json.loads(body)
+        except ValueError as exc:
+            return 400, _dumps({"error": f"JSON non valido: {exc}"})
+        if self.pending >= self.max_pending:  # coda singoli + ordini bulk in calcolo, come in _quotes
+            return 503, b'{"error": "troppe richieste in coda, riprovare"}'
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((order, future))
+        return await future
+
+    async def _quotes(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError as exc:
+            return 400, _dumps({"error": f"JSON non valido: {exc}"})
+        orders = payload.get('orders') if isinstance(payload, dict) else payload
+        if not isinstance(orders, list):
+            return 400, b'{"error": "atteso {\\"orders\\": [...]} o una lista di ordini"}'
+        if self.pending + len(orders) > self.max_pending:
+            return 503, b'{"error": "troppe richieste in coda, riprovare"}'
+        self._bulk_pending += len(orders)
+        try:
+            loop = asyncio.get_running_loop()
+            chunks = [orders[i:i + self.batch_size] for i in range(0, len(orders), self.batch_size)]
+            parts = await asyncio.gather(*(loop.run_in_executor(self._executor, quote_bulk, chunk) for chunk in chunks))
+        finally:
+            self._bulk_pending -= len(orders)
+        return 200, b'{"quotes": [' + b", ".join(quote for part in parts for quote in part) + b']}'
+
+    async def _dispatch(self, method, path, body):
+        path = path.split('?', 1)[0]
+        if path == "/health":
+            info = _cache.cache_info() if self.workers <= 1 else None
+            return 200, _dumps({"status": "ok", "pending": self.pending, "cache": info._asdict() if info else None})
+        if path not in ("/quote", "/quotes"):
+            return 404, b'{"error": "endpoint sconosciuto"}'
+        if method != "POST":
+            return 405, b'{"error": "usare POST"}'
+        return await (self._quote(body) if path == "/quote" else self._quotes(body))
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    status, body = 413, b'{"error": "richiesta troppo grande"}'
+                    keep_alive = False
+                else:
+                    status, body = await self._dispatch(method, path, await reader.readexactly(length))
+                    keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != "close"
+                head = (f"{version} {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(body)}\r\n")
+                if status == 503:
+                    head += "Retry-After: 1\r\n"
+                head += "\r\n" if keep_alive else "Connection: close\r\n\r\n"
+                writer.write(head.encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # connessione chiusa o richiesta malformata: si chiude e basta
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._batchers = [asyncio.create_task(self._batcher()) for _ in range(max(self.workers, 1))]
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in self._batchers:
+                task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servizio HTTP locale di preventivi commissioni eBay.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=1, help="processi di calcolo (0 = tutti i core)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW * 1000)
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument("--reload-interval", type=float, default=5.0,
+                        help="secondi tra i controlli del file listino (0 = mai)")
+    args = parser.parse_args(argv)
+
+    server = QuoteServer(workers=args.workers or os.cpu_count() or 1, batch_size=args.batch_size,
+                         batch_window=args.batch_window_ms / 1000, max_pending=args.max_pending,
+                         reload_interval=args.reload_interval)
+    ready = lambda s: print(f"In ascolto su http://{args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
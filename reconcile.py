@@ -0,0 +1,347 @@
+"""Riconciliazione ordini eBay da riga di comando.
+
+Legge un export CSV/Parquet a blocchi di dimensione fissa, calcola commissioni e
+utile netto con il motore batch e scrive il risultato blocco per blocco: la memoria
+resta costante qualunque sia la dimensione del file. Con --workers N i blocchi
+vengono distribuiti su un process pool mantenendo l'ordine delle righe.
+
+Esempio:
+    python reconcile.py ordini.csv -o utile.csv --workers 4 --set vat_rate_input=22 \\
+        --column item_price=Prezzo --column category_id=Categoria --id-column NumeroOrdine
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_engine import CENT_FIELDS, calculate_fees_batch, load_fee_tables
+from fee_engine import DEFAULT_FEE_FILE
+from order_params import PARAMS, TRUE_VALUES
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+# --- Input ---
+def _parse_column(values, kind, decimal_comma):
+    """Colonna grezza -> array del tipo del parametro; ValueError(messaggio, indice della riga) se non valida."""
+    raw = arr = np.asarray(values)
+    if kind is bool:
+        return arr if arr.dtype == bool else np.isin(np.char.lower(np.char.strip(arr.astype(str))), list(TRUE_VALUES))
+    if kind is str:
+        return arr.astype(str)
+    if arr.dtype.kind in "US":
+        if decimal_comma:
+            arr = np.char.replace(np.char.replace(arr, '.', ''), ',', '.')
+        try:
+            arr = arr.astype(np.float64)
+        except ValueError:
+            for i, text in enumerate(arr.tolist()):
+                try:
+                    float(text)
+                except ValueError:
+                    raise ValueError(f"valore numerico non valido {str(raw[i])!r}", i) from None
+            raise
+    if kind is int and arr.dtype.kind == "f":
+        bad = ~np.isfinite(arr) | (arr != np.trunc(arr))
+        if bad.any():  # es. ID categoria "171485.9": troncarlo darebbe un'altra categoria
+            i = int(np.argmax(bad))
+            raise ValueError(f"valore non intero {str(raw[i])!r}", i)
+    return arr.astype(np.int64) if kind is int else arr.astype(np.float64)
+
+
+def _fill_blanks(values, default, column, first_row, decimal_comma):
+    """Celle vuote (o None da Parquet) -> default del parametro; SystemExit se la colonna e' obbligatoria."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in "US":
+        blank = arr == ''
+    elif arr.dtype == object:
+        blank = np.array([v is None or v == '' for v in arr.tolist()], dtype=bool)
+    else:
+        return arr
+    if not blank.any():
+        return arr
+    if default is None:
+        raise SystemExit(f"Colonna '{column}': valore mancante alla riga {first_row + int(np.argmax(blank)) + 1}")
+    if arr.dtype.kind in "US" or any(isinstance(v, str) for v in arr[~blank].tolist()):
+        default = str(default).replace('.', ',') if decimal_comma else str(default)
+        arr = arr.astype(object)
+    arr = arr.copy()
+    arr[blank] = default
+    return np.array(arr.tolist())
+
+
+def iter_csv_chunks(path, chunk_size, delimiter):
+    handle = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(handle, delimiter=delimiter)
+        header = next(reader, None)
+        if not header:
+            return
+        chunk = []
+        for row in reader:
+            if len(row) != len(header) or not any(row):
+                if not any(field.strip() for field in row):  # righe vuote o di soli separatori (es. in coda)
+                    continue
+                raise SystemExit(f"{path}: riga {reader.line_num} con {len(row)} campi invece di {len(header)}")
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield dict(zip(header, map(list, zip(*chunk))))
+                chunk = []
+        if chunk:
+            yield dict(zip(header, map(list, zip(*chunk))))
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def iter_parquet_chunks(path, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Per leggere file Parquet serve pyarrow (pip install pyarrow).")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pydict()
+
+
+def build_batch_args(raw, columns, constants, decimal_comma, first_row=0):
+    """Blocco grezzo -> (righe, argomenti di calculate_fees_batch); first_row numera le righe nei messaggi."""
+    n = len(next(iter(raw.values())))
+    kwargs = {}
+    for param, (kind, default) in PARAMS.items():
+        if param in constants:
+            try:
+                kwargs[param] = _parse_column([constants[param]], kind, False)[0]
+            except ValueError as exc:
+                raise SystemExit(f"--set {param}={constants[param]}: {exc.args[0]}") from None
+        elif columns.get(param, param) in raw:
+            column = columns.get(param, param)
+            numeric_comma = decimal_comma and kind in (float, int)
+            values = _fill_blanks(raw[column], default, column, first_row, numeric_comma)
+            try:
+                kwargs[param] = _parse_column(values, kind, numeric_comma)
+            except (TypeError, ValueError) as exc:
+                where = (f"alla riga {first_row + exc.args[1] + 1}" if len(exc.args) > 1
+                         else f"nelle righe {first_row + 1}-{first_row + n}")
+                raise SystemExit(f"Colonna '{column}': {exc.args[0]} {where}") from None
+        elif default is not None:
+            kwargs[param] = default
+        else:
+            raise SystemExit(f"Colonna obbligatoria mancante: '{columns.get(param, param)}' (per {param})")
+    return n, kwargs
+
+
+# --- Computation (anche nei worker) ---
+_worker_tables = None
+
+
+def _init_worker(fee_file):
+    global _worker_tables
+    _worker_tables = load_fee_tables(fee_file)
+
+
+def format_cents(cents):
+    # cents/100 e' il double piu' vicino al valore esatto: '%.2f' lo riporta al centesimo giusto
+    return ["%.2f" % v for v in (np.asarray(cents, dtype=np.int64) / 100).tolist()]
+
+
+def process_chunk(job):
+    """(id, argomenti, righe) -> (id, colonne CENT_FIELDS in centesimi int64, nomi dei gruppi CVF)."""
+    ids, kwargs, n = job
+    results = calculate_fees_batch(_worker_tables, **kwargs)
+    cents = [np.broadcast_to(np.asarray(results[field], dtype=np.int64), (n,)) for field in CENT_FIELDS]
+    groups = np.array(_worker_tables['group_names'])[np.broadcast_to(results['fvf_group'], (n,))].tolist()
+    return ids, cents, groups
+
+
+def _ordered_map(fn, jobs, workers, fee_file):
+    """Come map(): risultati nell'ordine dei blocchi, con al massimo 2*workers blocchi in volo."""
+    if workers <= 1:
+        _init_worker(fee_file)
+        yield from map(fn, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fee_file,)) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(fn, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- Output ---
+class _CsvSink:
+    def __init__(self, path, header, delimiter):
+        self.handle = sys.stdout if path == "-" else open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.handle, delimiter=delimiter)
+        self.writer.writerow(header)
+
+    def write(self, ids, cents, groups):
+        columns = [format_cents(values) for values in cents]
+        if ids is not None:
+            columns.insert(0, ids)
+        self.writer.writerows(zip(*columns, groups))
+
+    def close(self):
+        if self.handle is not sys.stdout:
+            self.handle.close()
+
+
+class _ParquetSink:
+    """Importi come decimal128(18, 2) esatti, gruppo CVF come stringa, id con il tipo del primo blocco."""
+
+    def __init__(self, path, header):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Per scrivere file Parquet serve pyarrow (pip install pyarrow).")
+        self.pa, self.pq, self.path, self.header = pa, pq, path, header
+        self.writer = None
+
+    def _decimal(self, cents):
+        # decimal128 = intero a 128 bit in complemento a due: parte bassa i centesimi, alta il segno
+        words = np.empty((len(cents), 2), dtype=np.int64)
+        words[:, 0] = cents
+        words[:, 1] = cents >> 63
+        return self.pa.Array.from_buffers(self.pa.decimal128(18, 2), len(cents), [None, self.pa.py_buffer(words)])
+
+    def _schema(self, id_type):
+        pa = self.pa
+        fields = [(name, pa.decimal128(18, 2)) for name in CENT_FIELDS] + [("fvf_group_name", pa.string())]
+        return pa.schema(([(self.header[0], id_type)] if len(self.header) > len(fields) else []) + fields)
+
+    def write(self, ids, cents, groups):
+        arrays = [self._decimal(values) for values in cents] + [self.pa.array(groups, self.pa.string())]
+        if ids is not None:
+            arrays.insert(0, self.pa.array(ids))
+        if self.writer is None:
+            id_type = arrays[0].type if ids is not None and arrays[0].null_count < len(ids) else self.pa.string()
+            self.writer = self.pq.ParquetWriter(self.path, self._schema(id_type))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, names=self.header).cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is None:  # input vuoto: file con il solo schema
+            self.writer = self.pq.ParquetWriter(self.path, self._schema(self.pa.string()))
+        self.writer.close()
+
+
+def _is_parquet(path):
+    return path.lower().endswith(".parquet")
+
+
+def reconcile(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, columns=None,
+              constants=None, id_column=None, fee_file=DEFAULT_FEE_FILE, delimiter=',', decimal_comma=False):
+    columns, constants = columns or {}, constants or {}
+    chunks = (iter_parquet_chunks(input_path, chunk_size) if _is_parquet(input_path)
+              else iter_csv_chunks(input_path, chunk_size, delimiter))
+
+    def jobs():
+        first_row = 0
+        for raw in chunks:
+            n, kwargs = build_batch_args(raw, columns, constants, decimal_comma, first_row)
+            if id_column is not None and id_column not in raw:
+                raise SystemExit(f"Colonna identificativa mancante: '{id_column}'")
+            yield (raw[id_column] if id_column else None), kwargs, n
+            first_row += n
+
+    header = ([id_column] if id_column else []) + list(CENT_FIELDS) + ["fvf_group_name"]
+    sink = _ParquetSink(output_path, header) if _is_parquet(output_path) else _CsvSink(output_path, header, delimiter)
+    total = chunk = 0
+    try:
+        for chunk, (ids, cents, groups) in enumerate(_ordered_map(process_chunk, jobs(), workers, fee_file), 1):
+            sink.write(ids, cents, groups)
+            total += len(groups)
+    except (KeyError, ValueError) as exc:
+        where = f"Blocco {chunk + 1} (dalla riga {total + 1})"
+        if isinstance(exc, KeyError):  # l'unico KeyError del motore batch: negozio assente dal listino
+            param = 'store_subscription'
+            where += f", --set {param}" if param in constants else f", colonna '{columns.get(param, param)}'"
+        raise SystemExit(f"{where}: {exc.args[0] if exc.args else exc}") from None
+    finally:
+        sink.close()
+    return total
+
+
+# (nome, CSV di input, total_sale_price atteso per riga o None = l'input va rifiutato)
+_REGRESSION_CASES = [
+    ("riga vuota in coda", "id,item_price,category_id,shipping_charged_to_customer\n1,100,171485,10\n\n", ["110.00"]),
+    ("righe vuote e di soli separatori", "id,item_price,category_id\n\n1,100,171485\n,,\n2,50,171485\n", ["100.00", "50.00"]),
+    ("riga corta", "id,item_price,category_id,shipping_charged_to_customer\n1,100,171485,10\n2,50,171485\n", None),
+    ("riga lunga", "id,item_price,category_id\n1,100,171485,10\n", None),
+    ("categoria non intera", "id,item_price,category_id\n1,100,171485\n2,100,171485.9\n", None),
+    ("inserzioni non intere", "id,item_price,category_id,num_listings_this_month\n1,100,171485,12.7\n", None),
+    ("interi scritti con decimali", "id,item_price,category_id,num_listings_this_month\n1,100,171485.0,12.0\n", ["100.00"]),
+]
+
+
+def regression_check():
+    """Esegue reconcile sui casi di _REGRESSION_CASES; restituisce {caso: esito ottenuto} per quelli falliti."""
+    import tempfile
+
+    failed = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        src, out = os.path.join(tmp, "in.csv"), os.path.join(tmp, "out.csv")
+        for name, text, expected in _REGRESSION_CASES:
+            with open(src, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            try:
+                reconcile(src, out)
+            except SystemExit as exc:
+                got = f"rifiutato: {exc}"
+            else:
+                with open(out, encoding='utf-8', newline='') as f:
+                    got = [row['total_sale_price'] for row in csv.DictReader(f)]
+            if (expected is None) != isinstance(got, str) or (expected is not None and got != expected):
+                failed[name] = got
+    return failed
+
+
+def _key_values(pairs, option):
+    parsed = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep or key not in PARAMS:
+            raise SystemExit(f"{option} {pair!r}: atteso <parametro>=<valore>, parametri: {', '.join(PARAMS)}")
+        parsed[key] = value
+    return parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcola utile netto e commissioni eBay per un export ordini.")
+    parser.add_argument("input", nargs="?", help="file CSV o .parquet ('-' = stdin, solo CSV)")
+    parser.add_argument("-o", "--output", default="-", help="file CSV o .parquet ('-' = stdout)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="processi (0 = tutti i core)")
+    parser.add_argument("--column", action="append", default=[], metavar="PARAM=COLONNA",
+                        help="colonna di input da usare per un parametro")
+    parser.add_argument("--set", action="append", default=[], metavar="PARAM=VALORE",
+                        help="valore costante per un parametro (ignora la colonna)")
+    parser.add_argument("--id-column", help="colonna da riportare in output (es. numero ordine)")
+    parser.add_argument("--fee-file", default=DEFAULT_FEE_FILE)
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--decimal-comma", action="store_true", help="numeri nel formato 1.234,56")
+    parser.add_argument("--check", action="store_true", help="esegue i casi di regressione sugli input malformati")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failed = regression_check()
+        print(f"Casi di regressione falliti: {len(failed)} {failed or ''}")
+        raise SystemExit(1 if failed else 0)
+    if args.input is None:
+        parser.error("serve il file di input (oppure --check)")
+
+    total = reconcile(args.input, args.output, chunk_size=args.chunk_size,
+                      workers=args.workers or os.cpu_count() or 1,
+                      columns=_key_values(args.column, "--column"), constants=_key_values(args.set, "--set"),
+                      id_column=args.id_column, fee_file=args.fee_file, delimiter=args.delimiter,
+                      decimal_comma=args.decimal_comma)
+    print(f"{total} ordini riconciliati", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Griglia di scenari (prezzo x paese x stato venditore x negozio) per la vista "Scenari".
+
+Le commissioni di tutte le fette mancanti si calcolano in un solo passaggio batch;
+ogni fetta (paese, stato, negozio) viene memorizzata in una cache passata dal
+chiamante (nell'app: st.session_state) e riusata ai rerun successivi finche' non cambia
+il listino. Costo oggetto e costo di spedizione reale non entrano nelle commissioni:
+cambiarli non invalida nulla.
+"""
+import numpy as np
+
+from batch_engine import _to_cents_array, calculate_fees_batch
+
+# celle prezzo x scenario in cache (16 byte l'una: ~16 MB), oltre quelle della griglia corrente
+SWEEP_CACHE_MAX_CELLS = 1_000_000
+
+
+def price_grid(price_min, price_max, steps):
+    # Griglia al centesimo, senza duplicati
+    cents = np.unique(np.round(np.linspace(price_min, price_max, int(steps)) * 100).astype(np.int64))
+    return cents[cents > 0]
+
+
+def sweep_fees(tables, cache, price_cents, scenarios, fee_inputs):
+    """Commissioni per ogni scenario (paese, stato, negozio) sulla griglia di prezzi.
+
+    `fee_inputs` sono gli altri argomenti di `calculate_fees_batch` che influiscono sulle
+    commissioni. Restituisce ({scenario: (totale vendita, commissioni IVA incl.) in centesimi},
+    numero di fette ricalcolate).
+    """
+    base_key = (tables.get('fingerprint'), price_cents.tobytes(), tuple(sorted(fee_inputs.items())))
+    missing = []
+    for s in scenarios:
+        if (base_key, s) in cache:
+            cache[(base_key, s)] = cache.pop((base_key, s))  # in coda: la cache e' LRU
+        else:
+            missing.append(s)
+    if missing:
+        n = len(price_cents)
+        countries, statuses, stores = zip(*missing)
+        results = calculate_fees_batch(
+            tables, item_price=np.tile(price_cents, len(missing)) / 100,
+            item_cost=0.0, your_actual_shipping_cost=0.0,
+            buyer_country=np.repeat(countries, n), seller_status=np.repeat(statuses, n),
+            store_subscription=np.repeat(stores, n), **fee_inputs)
+        totals = np.broadcast_to(results['total_sale_price'], (len(missing) * n,)).reshape(len(missing), n)
+        fees = np.broadcast_to(results['total_fees_incl_vat'], (len(missing) * n,)).reshape(len(missing), n)
+        for i, scenario in enumerate(missing):
+            cache[(base_key, scenario)] = (totals[i].copy(), fees[i].copy())
+        # dict in ordine di inserimento: via le fette meno recenti, mai quelle della griglia corrente
+        cells = sum(len(totals) for totals, _ in cache.values())
+        while cells > SWEEP_CACHE_MAX_CELLS and len(cache) > len(scenarios):
+            cells -= len(cache.pop(next(iter(cache)))[0])
+    return {s: cache[(base_key, s)] for s in scenarios}, len(missing)
+
+
+def net_profit_grid(slices, item_cost, your_actual_shipping_cost):
+    """Utile netto in euro (scenari x prezzi) a partire dalle fette di commissioni."""
+    costs = _to_cents_array(item_cost) + _to_cents_array(your_actual_shipping_cost)
+    return np.array([(totals - fees - costs) / 100 for totals, fees in slices.values()])
@@ -0,0 +1,55 @@
+"""Scaglioni CVF precompilati: punti di soglia, aliquote e commissione cumulata.
+
+Come una tabella fiscale: la commissione per un prezzo e' una ricerca binaria
+sulla soglia piu' una moltiplicazione-somma, indipendentemente dal numero di scaglioni.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+TierSchedule = namedtuple("TierSchedule", ["breakpoints", "rates", "cumulative"])
+
+_CENT = Decimal('0.01')
+
+
+def _eur(value):
+    return Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def compile_tier_schedule(tiers):
+    """Normalizza le forme `up_to_eur`/`from_eur`+`to_eur`/`above_eur` in segmenti contigui.
+
+    I buchi tra scaglioni hanno aliquota 0; oltre l'ultimo scaglione chiuso la commissione non cresce.
+    """
+    segments = []
+    for tier in tiers:
+        rate = Decimal(str(tier['rate']))
+        if 'up_to_eur' in tier:
+            segments.append((Decimal('0.00'), _eur(tier['up_to_eur']), rate))
+        elif 'from_eur' in tier and 'to_eur' in tier:
+            segments.append((_eur(tier['from_eur']), _eur(tier['to_eur']), rate))
+        elif 'above_eur' in tier:
+            segments.append((_eur(tier['above_eur']), None, rate))
+    segments.sort(key=lambda s: (s[0], s[1] is None))
+
+    breakpoints, rates, cursor = [], [], Decimal('0.00')
+    for start, end, rate in segments:
+        if start > cursor:
+            breakpoints.append(cursor); rates.append(Decimal('0'))
+        breakpoints.append(max(start, cursor)); rates.append(rate)
+        if end is None:
+            break
+        cursor = max(cursor, end)
+    else:
+        breakpoints.append(cursor); rates.append(Decimal('0'))
+
+    cumulative = [Decimal('0')]
+    for k in range(1, len(breakpoints)):
+        cumulative.append(cumulative[-1] + (breakpoints[k] - breakpoints[k - 1]) * rates[k - 1])
+    return TierSchedule(tuple(breakpoints), tuple(rates), tuple(cumulative))
+
+
+def tiered_fee(schedule, price):
+    """Commissione (non arrotondata) per un prezzo Decimal gia' quantizzato al centesimo."""
+    i = max(bisect_right(schedule.breakpoints, price) - 1, 0)
+    return schedule.cumulative[i] + (price - schedule.breakpoints[i]) * schedule.rates[i]